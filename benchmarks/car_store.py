@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from benchmarks.helpers import grid_for, place_cars
+from game_model.car import Car
+from game_model.car_store import CarStore
+from game_model.road_network import true_direction
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench(cars: int):
+    # Same fleet twice: plain cars for the scalar loops, stored cars for the vectorized calls
+    roads, segments = grid_for(cars)
+    plain = place_cars(segments, cars, Car)
+    roads, segments = grid_for(cars)
+    store = CarStore(cars)
+    place_cars(segments, cars, store.create_car)
+    speed_diffs = np.random.default_rng(0).integers(-1, 2, size=store.count)
+
+    def scalar_speeds():
+        for car, diff in zip(plain, speed_diffs):
+            car.speed = max(min(car.speed + diff, car.max_speed), 0)
+
+    def scalar_positions():
+        for car in plain:
+            car.loc += (1 if true_direction[car.res[0].dir] else -1) * car.speed
+
+    def scalar_braking():
+        return [car.get_braking_distance() for car in plain]
+
+    results = {
+        "speed": (timed(scalar_speeds), timed(lambda: store.change_speeds(speed_diffs))),
+        "position": (timed(scalar_positions), timed(store.advance)),
+        "braking": (timed(scalar_braking), timed(store.braking_distances)),
+    }
+    for name, (scalar, vectorized) in results.items():
+        print(f"{cars:>6} cars {name:>9}: loop {scalar * 1e6:9.1f}us  "
+              f"store {vectorized * 1e6:7.1f}us  x{scalar / vectorized:6.1f}")
+
+
+if __name__ == '__main__':
+    for n in [50, 500, 5000]:
+        bench(n)
@@ -0,0 +1,60 @@
+import random
+import time
+
+from benchmarks.helpers import grid_for, spawn_segments
+from game_model.car import Car
+from game_model.collision_kernel import collision_pairs_vectorized, size_spans, span_collisions
+from game_model.constants import *
+from game_model.helper_functions import collision_pairs
+from game_model.road_network import true_direction
+
+
+def crowded_cars(segments, cars: int, per_segment: int = 3, seed: int = 0) -> list[Car]:
+    """ Several cars at random places of each lane segment, so that some of them collide """
+    rng = random.Random(seed)
+    placed = []
+    for seg in spawn_segments(segments):
+        for _ in range(per_segment):
+            if len(placed) == cars:
+                return placed
+            size = rng.randint(BLOCK_SIZE // 2, BLOCK_SIZE)
+            car = Car(name=f"car{len(placed)}",
+                      loc=0,
+                      segment=seg,
+                      speed=rng.randint(0, 2),
+                      size=size,
+                      color=WHITE,
+                      max_speed=BLOCK_SIZE // 4)
+            # Cars can only be created at the beginning of a segment, so drive them to their place
+            loc = rng.randint(0, seg.length - size)
+            car.loc = loc if true_direction[seg.lane.direction] else -loc
+            car.update_reservations()
+            placed.append(car)
+    return placed
+
+
+def timed(fn, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def bench(n: int, per_segment: int = 3):
+    roads, segments = grid_for((n + per_segment - 1) // per_segment)
+    cars = crowded_cars(segments, n, per_segment)
+
+    sweep, sweep_time = timed(lambda: collision_pairs(cars))
+    kernel, kernel_time = timed(lambda: collision_pairs_vectorized(cars))
+    # The kernel must find exactly the crashes of the object based check
+    assert sweep == kernel, f"{len(sweep ^ kernel)} pairs differ"
+    spans = size_spans(cars)
+    _, spans_time = timed(lambda: size_spans(cars))
+    _, array_time = timed(lambda: span_collisions(*spans))
+    print(f"{n:>6} cars, {len(sweep):>5} colliding pairs: sweep {sweep_time * 1e3:8.2f} ms, "
+          f"kernel {kernel_time * 1e3:8.2f} ms (spans {spans_time * 1e3:7.2f} ms + arrays {array_time * 1e3:6.2f} ms)")
+
+
+if __name__ == '__main__':
+    for n in [100, 1000, 10000, 30000]:
+        bench(n)
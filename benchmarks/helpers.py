@@ -0,0 +1,39 @@
+import random
+
+from game_model.constants import *
+from game_model.helper_functions import create_segments
+from game_model.maps import grid_roads
+from game_model.road_network import Road, LaneSegment
+
+
+def spawn_segments(segments) -> list[LaneSegment]:
+    # Lane segments leading into a crossing, the ones at the border of the grid lead nowhere
+    return [seg for seg in segments if isinstance(seg, LaneSegment) and seg.end_crossing is not None]
+
+
+def grid_for(cars: int) -> tuple[list[Road], list]:
+    """ The smallest grid with a free lane segment for every car """
+    n = 2
+    while True:
+        roads = grid_roads(n, n)
+        segments = create_segments(roads)
+        if len(spawn_segments(segments)) >= cars:
+            return roads, segments
+        n += 1
+
+
+def place_cars(segments, cars: int, create_car, seed: int = 0) -> list:
+    """ One car at the beginning of each of the first `cars` lane segments """
+    rng = random.Random(seed)
+    lane_segments = spawn_segments(segments)
+    placed = []
+    for i, seg in enumerate(lane_segments[:cars]):
+        max_speed = rng.randint(BLOCK_SIZE // 4, BLOCK_SIZE // 2)
+        placed.append(create_car(name=f"car{i}",
+                                 loc=0,
+                                 segment=seg,
+                                 speed=rng.randint(1, 3),
+                                 size=rng.randint(BLOCK_SIZE // 2, BLOCK_SIZE),
+                                 color=WHITE,
+                                 max_speed=max_speed))
+    return placed
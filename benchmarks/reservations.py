@@ -0,0 +1,66 @@
+import sys
+import time
+from types import SimpleNamespace
+
+import controller.astar_car_controller
+import game_model.car
+from benchmarks.helpers import grid_for, place_cars
+from controller.astar_car_controller import AstarCarController
+from game_model.car import Car
+from game_model.helper_functions import collision_check
+from game_model.road_network import Reservation, Direction
+
+
+class CountedReservation(Reservation):
+    __slots__ = ()
+    created = 0
+
+    def __init__(self, *args):
+        CountedReservation.created += 1
+        super().__init__(*args)
+
+
+def tick(cars, controllers, speed_diff):
+    for car, controller in zip(cars, controllers):
+        controller.get_accelerate(car.res)
+        collision_check(car)
+        car.change_speed(speed_diff)
+        car.move()
+
+
+def record_sizes() -> tuple[int, int]:
+    # A reservation as the per-segment dict it used to be, and as a slotted record
+    as_dict = {"seg": None, "dir": Direction.RIGHT, "turn": False, "begin": 0, "end": 0}
+    return sys.getsizeof(as_dict), sys.getsizeof(Reservation(None, Direction.RIGHT, False, 0, 0))
+
+
+def bench(n: int, ticks: int = 10):
+    roads, segments = grid_for(n)
+    cars = place_cars(segments, n, Car)
+    # get_accelerate only needs the car of the controller
+    game = SimpleNamespace(cars=cars, goals=[None] * n)
+    controllers = [AstarCarController(game, player) for player in range(n)]
+
+    # Count every record created by the car and the controller
+    game_model.car.Reservation = CountedReservation
+    controller.astar_car_controller.Reservation = CountedReservation
+    CountedReservation.created = 0
+    start = time.perf_counter()
+    for i in range(ticks):
+        tick(cars, controllers, -1 if i % 2 else 1)
+    elapsed = (time.perf_counter() - start) / ticks
+    game_model.car.Reservation = Reservation
+    controller.astar_car_controller.Reservation = Reservation
+
+    dict_size, record_size = record_sizes()
+    created = CountedReservation.created / ticks
+    live = sum(len(car.res) for car in cars)
+    print(f"{n:>5} cars: {created:9.0f} records created per tick "
+          f"({created * dict_size / 1024:8.1f} KiB as dicts, {created * record_size / 1024:8.1f} KiB slotted), "
+          f"{live:>5} live ({live * dict_size / 1024:7.1f} KiB / {live * record_size / 1024:7.1f} KiB), "
+          f"{elapsed * 1e3:7.2f} ms per tick")
+
+
+if __name__ == '__main__':
+    for n in [50, 500, 5000]:
+        bench(n)
@@ -0,0 +1,231 @@
+""" Benchmarks of the simulation hot paths on fixed seeds.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline baseline.json
+
+Every benchmark is timed on a fresh game per repeat (the setup is not timed) and its peak memory is
+measured with tracemalloc in an extra run. A fresh game has a fresh network, so get_action and astar
+measure cold routing: every goal builds its next hop or heuristic table in the timed call.
+get_action_warm and astar_warm make the same calls once before timing them, so they measure routing
+from the shared caches and the planned routes. With --baseline the results are compared to a stored
+results file and the exit code is 1 if any benchmark got slower or bigger than the tolerance allows.
+
+hierarchy_route is not part of the default run, its contraction hierarchy takes minutes to build for
+5000 players. Run it on the smaller sizes with --only hierarchy_route --players 50 500. """
+import argparse
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from controller.astar_car_controller import AstarCarController
+from controller.contraction import ContractionHierarchy
+from game_model.game_model import TrafficEnv
+from game_model.helper_functions import create_segments, collision_check
+from game_model.maps import grid_roads
+from simulation.headless import HeadlessRunner
+
+PLAYERS = [10, 50, 500, 5000]
+# Routing is far more expensive than the car updates, so it is timed on at most this many cars
+ROUTING_SAMPLE = 50
+TICKS = 2
+
+# Contraction hierarchies by grid side, the build is offline work and far too slow to repeat per run
+_hierarchies: dict[int, ContractionHierarchy] = {}
+
+
+def grid_side(players: int) -> int:
+    # About four lane segments per car, so that the traffic stays comparable between sizes
+    return max(4, math.ceil(math.sqrt(players)) + 2)
+
+
+def new_game(players: int, seed: int) -> tuple[TrafficEnv, list[AstarCarController]]:
+    random.seed(seed)
+    side = grid_side(players)
+    game = TrafficEnv(grid_roads(side, side), players)
+    return game, [AstarCarController(game, player) for player in range(players)]
+
+
+# Every benchmark prepares a game and returns the timed function and the number of calls it makes
+
+def bench_create_segments(players, seed):
+    side = grid_side(players)
+    return lambda: create_segments(grid_roads(side, side)), 1
+
+
+def bench_reset(players, seed):
+    game, _ = new_game(players, seed)
+    return game.reset, 1
+
+
+def bench_move(players, seed):
+    game, _ = new_game(players, seed)
+    cars = [car for car in game.cars if not car.dead]
+    return lambda: [car.move() for car in cars], len(cars)
+
+
+def bench_extend_res(players, seed):
+    game, _ = new_game(players, seed)
+    cars = [car for car in game.cars if not car.dead]
+    return lambda: [car.extend_res() for car in cars], len(cars)
+
+
+def bench_change_speed(players, seed):
+    game, _ = new_game(players, seed)
+    cars = [car for car in game.cars if not car.dead]
+    return lambda: [car.change_speed(1 if i % 2 else -1) for i, car in enumerate(cars)], len(cars)
+
+
+def bench_collision_check(players, seed):
+    game, _ = new_game(players, seed)
+    return lambda: [collision_check(car) for car in game.cars], players
+
+
+def bench_get_action(players, seed):
+    game, controllers = new_game(players, seed)
+    sample = [controller for controller in controllers if not controller.car.dead][:ROUTING_SAMPLE]
+    return lambda: [controller.get_action() for controller in sample], len(sample)
+
+
+def bench_astar(players, seed):
+    game, controllers = new_game(players, seed)
+    sample = [controller for controller in controllers if not controller.car.dead][:ROUTING_SAMPLE]
+    return lambda: [controller.astar() for controller in sample], len(sample)
+
+
+def bench_get_action_warm(players, seed):
+    # The same calls again, now that the routes are planned and the next hop and heuristic tables exist
+    run, calls = bench_get_action(players, seed)
+    run()
+    return run, calls
+
+
+def bench_astar_warm(players, seed):
+    run, calls = bench_astar(players, seed)
+    run()
+    return run, calls
+
+
+def bench_hierarchy_route(players, seed):
+    game, controllers = new_game(players, seed)
+    side = grid_side(players)
+    if side not in _hierarchies:
+        _hierarchies[side] = ContractionHierarchy.build(game.network)
+    hierarchy = _hierarchies[side]
+    queries = [(controller.car.res[-1].seg.id, controller.goal.lane_segment.id)
+               for controller in controllers if not controller.car.dead][:ROUTING_SAMPLE]
+    return lambda: [hierarchy.route(segment, goal) for segment, goal in queries], len(queries)
+
+
+def bench_tick(players, seed):
+    game, controllers = new_game(players, seed)
+    runner = HeadlessRunner(game, controllers)
+    return lambda: runner.run(TICKS), TICKS
+
+
+BENCHMARKS = {"create_segments": bench_create_segments,
+              "reset": bench_reset,
+              "move": bench_move,
+              "extend_res": bench_extend_res,
+              "change_speed": bench_change_speed,
+              "collision_check": bench_collision_check,
+              "get_action": bench_get_action,
+              "get_action_warm": bench_get_action_warm,
+              "astar": bench_astar,
+              "astar_warm": bench_astar_warm,
+              "hierarchy_route": bench_hierarchy_route,
+              "tick": bench_tick}
+# Building a contraction hierarchy for 5000 players takes minutes, so it is only run when asked for with --only
+DEFAULT = [name for name in BENCHMARKS if name != "hierarchy_route"]
+
+
+def measure(name: str, players: int, seed: int, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        run, calls = BENCHMARKS[name](players, seed)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    run, calls = BENCHMARKS[name](players, seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    seconds = statistics.median(times)
+    return {"name": name,
+            "players": players,
+            "seed": seed,
+            "repeat": repeat,
+            "calls": calls,
+            "seconds": seconds,
+            "min_seconds": min(times),
+            "seconds_per_call": seconds / calls,
+            "peak_bytes": peak}
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """ Descriptions of the benchmarks that got slower or use more memory than the baseline allows """
+    base = {(result["name"], result["players"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = base.get((result["name"], result["players"]))
+        if old is None:
+            continue
+        time_ratio = result["seconds_per_call"] / old["seconds_per_call"]
+        if time_ratio > 1 + tolerance:
+            regressions.append(f"{result['name']} ({result['players']} players): "
+                               f"{time_ratio:.2f}x the time of the baseline")
+        # Small absolute differences are allocator noise
+        if result["peak_bytes"] > old["peak_bytes"] * (1 + tolerance) + 64 * 1024:
+            regressions.append(f"{result['name']} ({result['players']} players): "
+                               f"peak memory {old['peak_bytes'] / 1024:.0f} -> {result['peak_bytes'] / 1024:.0f} KiB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--players", type=int, nargs="+", default=PLAYERS)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=DEFAULT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    results = []
+    for players in args.players:
+        for name in args.only:
+            result = measure(name, players, args.seed, args.repeat)
+            results.append(result)
+            print(f"{name:>16} {players:>5} players: {result['seconds'] * 1e3:10.2f} ms "
+                  f"({result['seconds_per_call'] * 1e6:10.1f} us per call), "
+                  f"peak {result['peak_bytes'] / 1024:9.1f} KiB", file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "machine": platform.machine(),
+                       "results": results}, file, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,55 +1,73 @@
-from controller.helper_functions import astar_heuristic, reconstruct_path
+import heapq
+
+from controller.contraction import ContractionHierarchy
+from controller.helper_functions import goal_heuristics, reconstruct_path, search_buffers
+from controller.routing import NextHopRouter, shared_router
 from game_model.game_model import TrafficEnv
-from game_model.road_network import LaneSegment, CrossingSegment, Segment
+from game_model.road_network import LaneSegment, CrossingSegment, Segment, Reservation
 
 
 class AstarCarController:
-    def __init__(self, game: TrafficEnv, player: int):
+    def __init__(self, game: TrafficEnv, player: int, router: NextHopRouter | ContractionHierarchy = None):
         self.game = game
         self.player = player
+        # Next hop tables shared by all controllers on the same network, unless another router is given.
+        # Only looked up on the first route, get_accelerate alone never needs one
+        self._router = router
+
+        # The planned route to route_goal, and the position in it of the last segment the car reserved
+        self.next_segments: list[Segment] = []
+        self.route_goal: LaneSegment = None
+        self.cursor = 0
+        # Number of routes planned, for statistics
+        self.plans = 0
+
+    # The game replaces its cars and goals on reset, so they are always looked up
+    @property
+    def car(self):
+        return self.game.cars[self.player]
 
-        self.car = self.game.cars[player]
-        self.goal = self.game.goals[player]
-        self.next_segments = []
+    @property
+    def goal(self):
+        return self.game.goals[self.player]
+
+    @property
+    def router(self):
+        if self._router is None:
+            self._router = shared_router(self.game.network)
+        return self._router
 
     def get_action(self) -> int:
         dir_diff = 0
         lane_change = 0
-        acceleration = self.get_accelerate(self.car.res + self.car.parallel_res)
-        if isinstance(self.car.res[-1]["seg"], CrossingSegment):
-            next_segment = self.astar()
+        acceleration = self.get_accelerate(self.car.res + self.car.parallel_res if self.car.parallel_res
+                                           else self.car.res)
+        if isinstance(self.car.res[-1].seg, CrossingSegment):
+            next_segment = self.next_segment()
             next_direction = self.car.direction
-            for direction, segment in self.car.res[-1]["seg"].connected_segments.items():
+            for direction, segment in self.car.res[-1].seg.connected_segments.items():
                 if next_segment == segment:
                     next_direction = direction
-            dir_diff = (next_direction.value - self.car.res[-1]["dir"].value) % 4
+            dir_diff = (next_direction.value - self.car.res[-1].dir.value) % 4
             if dir_diff == 3:
                 dir_diff = 2
 
-        elif isinstance(self.car.res[0]["seg"], LaneSegment) \
+        elif isinstance(self.car.res[0].seg, LaneSegment) \
                 and acceleration < 1 and len(self.car.res) == 1 \
-                and self.car.res[0]["seg"] != self.game.goals[self.player].lane_segment:
+                and self.car.res[0].seg != self.game.goals[self.player].lane_segment:
             right_lane = self.car.get_adjacent_lane_segment(-1)
             if right_lane is not None:
-                right_lane_acceleration = self.get_accelerate([{
-                    "seg": right_lane,
-                    "dir": self.car.direction,
-                    "turn": False,
-                    "begin": self.car.res[0]["begin"],
-                    "end": self.car.res[0]["end"]
-                }])
+                right_lane_acceleration = self.get_accelerate([Reservation(right_lane, self.car.direction, False,
+                                                                           self.car.res[0].begin,
+                                                                           self.car.res[0].end)])
                 if right_lane_acceleration > acceleration:
                     lane_change = -1
                 else:
                     left_lane = self.car.get_adjacent_lane_segment(1)
                     if left_lane is not None:
-                        left_lane_acceleration = self.get_accelerate([{
-                            "seg": left_lane,
-                            "dir": self.car.direction,
-                            "turn": False,
-                            "begin": self.car.res[0]["begin"],
-                            "end": self.car.res[0]["end"]
-                        }])
+                        left_lane_acceleration = self.get_accelerate([Reservation(left_lane, self.car.direction, False,
+                                                                                  self.car.res[0].begin,
+                                                                                  self.car.res[0].end)])
                         if left_lane_acceleration > acceleration:
                             lane_change = 1
         action = acceleration
@@ -59,76 +77,109 @@ class AstarCarController:
             action = lane_change * 100 + action
         return action
 
-    def astar(self) -> list[Segment]:
-        start_seg = self.car.res[-1]["seg"]
-        goal_seg = self.goal.lane_segment
-        # Initialize the open list with the start node and a cost of 0
-        open_list = [(0, start_seg)]
-        # Initialize the came_from dictionary to track the path
-        came_from: dict[Segment, Segment] = {}
-        # Initialize the g_score dictionary to store the cost from start to each node
-        g_score = {node: float('inf') for node in self.game.segments}
-        g_score[start_seg] = 0
-        # Initialize the f_score dictionary to store the total estimated cost from start to goal
-        f_score = {node: float('inf') for node in self.game.segments}
-        f_score[start_seg] = astar_heuristic(start_seg, goal_seg)  # Replace with your heuristic function
-
-        while open_list:
-            _, current_seg = open_list.pop(0)
-
-            if current_seg == goal_seg:
-                return reconstruct_path(came_from, current_seg)[1]
-
-            neighbors = []
+    def next_segment(self) -> Segment:
+        """ The segment after the last reserved one on a shortest path to the goal, like astar.
+        Follows the planned route and only plans again for a new goal or once the car left the route. """
+        last_seg = self.car.res[-1].seg
+        route = self.next_segments
+        if self.route_goal is self.goal.lane_segment:
+            # The car only moves forward along the route
+            for i in range(self.cursor, len(route) - 1):
+                if route[i] is last_seg:
+                    self.cursor = i
+                    return route[i + 1]
+        self.plan(last_seg)
+        return self.next_segments[1] if len(self.next_segments) > 1 else None
+
+    def plan(self, start_seg: Segment):
+        segments = self.game.segments
+        self.route_goal = self.goal.lane_segment
+        self.next_segments = [segments[i] for i in self.router.route(start_seg.id, self.route_goal.id)]
+        self.cursor = 0
+        self.plans += 1
+
+    def astar(self) -> Segment:
+        """ The segment after the last reserved one on the shortest path to the goal """
+        path = self.astar_path(self.car.res[-1].seg, self.goal.lane_segment)
+        return path[1] if path is not None and len(path) > 1 else None
+
+    def astar_path(self, start_seg: Segment, goal_seg: LaneSegment) -> list[Segment]:
+        """ The shortest path from start_seg to goal_seg, both included, or None if there is none.
+        Leaving a segment costs its weight in the network, so the path is the one every router finds. """
+        segments = self.game.segments
+        goal = goal_seg.id
+        heuristics = goal_heuristics(self.game.network)
+        heuristic = heuristics(goal)
+        weight = heuristics.weight
+        buffers = search_buffers(len(segments))
+        generation = buffers.start()
+        stamp, g_score, came_from = buffers.stamp, buffers.g_score, buffers.came_from
+        stamp[start_seg.id] = generation
+        g_score[start_seg.id] = 0
+        came_from[start_seg.id] = -1
+        # (f score, push count, g score, segment id), the push count keeps ties in the order they were found
+        open_heap = [(heuristic[start_seg.id], 0, 0, start_seg.id)]
+        pushed = 1
+
+        while open_heap:
+            _, _, g, current = heapq.heappop(open_heap)
+            if g > g_score[current]:
+                # A shorter way to this segment was found after this entry was pushed
+                continue
+            if current == goal:
+                return [segments[i] for i in reconstruct_path(came_from, current)]
+
+            current_seg = segments[current]
             match current_seg:
                 case LaneSegment():
                     neighbors = [current_seg.end_crossing] if current_seg.end_crossing is not None else []
                 case CrossingSegment():
-                    neighbors = [seg for seg in
-                                 current_seg.connected_segments.values()
-                                 if seg is not None]
+                    neighbors = [seg for seg in current_seg.connected_segments.values() if seg is not None]
 
+            tentative_g_score = g + weight[current]
             for neighbor in neighbors:
-                tentative_g_score = g_score[current_seg] + current_seg.length
-
-                if tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current_seg
-                    g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = g_score[neighbor] + astar_heuristic(neighbor, goal_seg)
-                    open_list.append((f_score[neighbor], neighbor))
+                i = neighbor.id
+                if stamp[i] != generation or tentative_g_score < g_score[i]:
+                    stamp[i] = generation
+                    g_score[i] = tentative_g_score
+                    came_from[i] = current
+                    heapq.heappush(open_heap, (tentative_g_score + heuristic[i], pushed, tentative_g_score, i))
+                    pushed += 1
 
         return None  # No path found
 
     def get_accelerate(self, segments):
         acceleration = 1
         extended_segments = segments
-        max_jump = segments[-1]["end"] + 2 * (self.car.speed + 1)
-        while max_jump > extended_segments[-1]["seg"].length:
-            # if segments[-1]["end"] + 2 * (self.car.speed + 1) > segments[-1]["seg"].length:
-            max_jump -= extended_segments[-1]["seg"].length
+        max_jump = segments[-1].end + 2 * (self.car.speed + 1)
+        while max_jump > extended_segments[-1].seg.length:
+            # if segments[-1].end + 2 * (self.car.speed + 1) > segments[-1].seg.length:
+            max_jump -= extended_segments[-1].seg.length
             next_seg = self.car.get_next_segment(extended_segments[-1])
             if next_seg is None:
                 return -1
-            extended_segments = extended_segments + [{
-                    "seg": next_seg,
-                    "dir": self.car.direction,
-                    "turn": False,
-                    "begin": 0,
-                    "end": min(max_jump, next_seg.length)
-            }]
+            if extended_segments is segments:
+                # Copy once, the reservations of the car must stay untouched
+                extended_segments = list(segments)
+            extended_segments.append(Reservation(next_seg, self.car.direction, False, 0,
+                                                 min(max_jump, next_seg.length)))
 
         # seg = extended_segments[-1]
         for seg in extended_segments:
-            priority = seg["seg"].cars.index(self.car) if self.car in seg["seg"].cars else len(seg["seg"].cars)
-            match seg["seg"]:
+            cars = seg.seg.cars
+            priority = cars.index(self.car) if self.car in cars else len(cars)
+            match seg.seg:
                 case LaneSegment():
-                    if priority > 0 and len(seg["seg"].cars) > 0:
-                        for i in range(priority):
-                            other_car = seg["seg"].cars[i]
-                            other_car_seg_info = other_car.get_segment_info(seg["seg"])
-                            end = abs(seg["end"])
-                            o_begin = abs(other_car_seg_info["begin"])
-                            o_end = abs(other_car_seg_info["end"])
+                    if priority > 0 and len(cars) > 0:
+                        end = abs(seg.end)
+                        # Only cars reserving something up to the farthest possible jump can slow this car down
+                        for other_car in seg.seg.intervals.overlapping(end, end + 2 * (self.car.speed + 1),
+                                                                       exclude=self.car):
+                            if cars.index(other_car) >= priority:
+                                continue
+                            other_car_seg_info = other_car.get_segment_info(seg.seg)
+                            o_begin = abs(other_car_seg_info.begin)
+                            o_end = abs(other_car_seg_info.end)
                             if o_begin <= end <= o_end:
                                 return -1
                             elif end + 2 * (self.car.speed + 1) < o_begin:
@@ -136,6 +187,6 @@ class AstarCarController:
                             elif end + 2 * self.car.speed < o_begin:
                                 acceleration = 0
                 case CrossingSegment():
-                    if priority > 0 and len(seg["seg"].cars) > 0:
+                    if priority > 0 and len(seg.seg.cars) > 0:
                         return -1
         return acceleration
@@ -0,0 +1,245 @@
+import heapq
+import os
+
+import numpy as np
+
+from game_model.compiled_network import CompiledNetwork
+from game_model.network_cache import load_arrays, road_key, save_arrays
+
+# Bump when the arrays of ContractionHierarchy change meaning, so old caches are not picked up
+HIERARCHY_VERSION = 1
+
+
+class ContractionHierarchy:
+    """ Shortest paths between any two segments of a compiled network, without a table per goal.
+    Built once by contracting the segments one at a time, least important first, and adding a shortcut
+    wherever a shortest path ran through the contracted segment. A query then only searches upwards in
+    rank from both ends. Costs are the network's weights, the same as for NextHopRouter and
+    AstarCarController.astar_path, so route() unpacks to exactly the segments astar_path returns.
+    The edges are stored as CSR arrays (see arrays) that can be saved next to the network.
+    Has route() like NextHopRouter, so it can be given to AstarCarController as its router. """
+
+    # up: edges to higher ranked segments, down: edges from higher ranked segments, stored at the lower one.
+    # middle is the segment a shortcut skips, -1 for edges of the network.
+    arrays = ("rank", "up_indptr", "up_indices", "up_weight", "up_middle",
+              "down_indptr", "down_indices", "down_weight", "down_middle")
+
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        for name in self.arrays:
+            setattr(self, name, arrays[name])
+        self._up = self._adjacency(self.up_indptr, self.up_indices, self.up_weight, self.up_middle)
+        self._down = self._adjacency(self.down_indptr, self.down_indices, self.down_weight, self.down_middle)
+        # The segment skipped by the shortcut from a to b, found at the lower ranked middle segment
+        self._up_middle = [{target: middle for target, _, middle in edges} for edges in self._up]
+        self._down_middle = [{source: middle for source, _, middle in edges} for edges in self._down]
+
+    def __len__(self):
+        return len(self.rank)
+
+    @staticmethod
+    def _adjacency(indptr, indices, weight, middle) -> list[list[tuple[int, int, int]]]:
+        indptr, indices, weight, middle = indptr.tolist(), indices.tolist(), weight.tolist(), middle.tolist()
+        return [list(zip(indices[indptr[i]:indptr[i + 1]], weight[indptr[i]:indptr[i + 1]],
+                         middle[indptr[i]:indptr[i + 1]]))
+                for i in range(len(indptr) - 1)]
+
+    @classmethod
+    def build(cls, network: CompiledNetwork, witness_limit: int = 64) -> "ContractionHierarchy":
+        """ Contracts every segment of network. Witness searches stop after witness_limit segments,
+        which can only add unneeded shortcuts, never lose a shortest path. """
+        n = len(network)
+        weight = network.weight.tolist()
+        indptr, indices = network.indptr.tolist(), network.indices.tolist()
+        # Remaining graph: segment -> {neighbour: (weight, middle)}
+        out = [{} for _ in range(n)]
+        into = [{} for _ in range(n)]
+        for u in range(n):
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                if v != u:
+                    out[u][v] = into[v][u] = (weight[u], -1)
+
+        contracted = [False] * n
+        # Contracted neighbours and the depth of the hierarchy below a segment,
+        # both spread the contraction evenly over the network
+        deleted = [0] * n
+        depth = [0] * n
+        rank = [0] * n
+        up = [None] * n
+        down = [None] * n
+
+        def witness(source: int, skip: int, limit: int) -> dict[int, int]:
+            # Distances from source without passing skip, as far as limit
+            distance = {source: 0}
+            queue = [(0, source)]
+            settled = 0
+            while queue and settled < witness_limit:
+                d, u = heapq.heappop(queue)
+                if d > distance[u]:
+                    continue
+                if d > limit:
+                    break
+                settled += 1
+                for v, (w, _) in out[u].items():
+                    if v != skip and d + w < distance.get(v, limit + 1):
+                        distance[v] = d + w
+                        heapq.heappush(queue, (d + w, v))
+            return distance
+
+        def shortcuts(v: int) -> list[tuple[int, int, int]]:
+            needed = []
+            if not out[v]:
+                return needed
+            longest = max(w for w, _ in out[v].values())
+            for u, (w_in, _) in into[v].items():
+                distance = witness(u, v, w_in + longest)
+                for x, (w_out, _) in out[v].items():
+                    if x != u and distance.get(x, w_in + w_out + 1) > w_in + w_out:
+                        needed.append((u, x, w_in + w_out))
+            return needed
+
+        def priority(v: int) -> int:
+            return len(shortcuts(v)) - len(out[v]) - len(into[v]) + deleted[v] + depth[v]
+
+        queue = [(priority(v), v) for v in range(n)]
+        heapq.heapify(queue)
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if contracted[v]:
+                continue
+            # Priorities go stale as neighbours are contracted, only contract v if it is still the least important
+            current = priority(v)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+            for u, x, cost in shortcuts(v):
+                if cost < out[u].get(x, (cost + 1,))[0]:
+                    out[u][x] = into[x][u] = (cost, v)
+            rank[v] = order
+            order += 1
+            contracted[v] = True
+            up[v] = sorted((x, w, middle) for x, (w, middle) in out[v].items())
+            down[v] = sorted((u, w, middle) for u, (w, middle) in into[v].items())
+            for x in out[v]:
+                del into[x][v]
+                deleted[x] += 1
+                depth[x] = max(depth[x], depth[v] + 1)
+            for u in into[v]:
+                del out[u][v]
+                deleted[u] += 1
+                depth[u] = max(depth[u], depth[v] + 1)
+            out[v] = {}
+            into[v] = {}
+
+        arrays = {"rank": np.array(rank, dtype=np.int32)}
+        for name, edges in (("up", up), ("down", down)):
+            arrays[f"{name}_indptr"] = np.cumsum([0] + [len(e) for e in edges]).astype(np.int64)
+            flat = [edge for e in edges for edge in e]
+            arrays[f"{name}_indices"] = np.array([edge[0] for edge in flat], dtype=np.int64)
+            arrays[f"{name}_weight"] = np.array([edge[1] for edge in flat], dtype=np.int64)
+            arrays[f"{name}_middle"] = np.array([edge[2] for edge in flat], dtype=np.int64)
+        return cls(arrays)
+
+    def route(self, segment: int, goal: int) -> list[int]:
+        """ Segment ids from segment to goal, both included, or just segment if the goal cannot be reached """
+        meeting, _, forward, backward = self._search(segment, goal)
+        if meeting is None:
+            return [segment]
+        # The edges of the hierarchy from segment to the meeting point and on to the goal
+        edges = []
+        node = meeting
+        while node != segment:
+            previous, middle = forward[node]
+            edges.append((previous, node, middle))
+            node = previous
+        edges.reverse()
+        node = meeting
+        while node != goal:
+            following, middle = backward[node]
+            edges.append((node, following, middle))
+            node = following
+        route = [segment]
+        for edge in edges:
+            self._unpack(edge, route)
+        return route
+
+    def distance(self, segment: int, goal: int) -> int:
+        """ Cost of the shortest path, None if there is none """
+        meeting, best, _, _ = self._search(segment, goal)
+        return None if meeting is None else best
+
+    def _search(self, source: int, target: int):
+        # Bidirectional Dijkstra, upwards in rank from both ends.
+        # Returns the meeting segment, the cost and the parents (segment, middle) of both searches.
+        forward = {source: (None, -1)}
+        backward = {target: (None, -1)}
+        distances = ({source: 0}, {target: 0})
+        parents = (forward, backward)
+        graphs = (self._up, self._down)
+        # Edges into u from higher ranked segments going forward, out of u going backward
+        stalls = (self._down, self._up)
+        queues = ([(0, source)], [(0, target)])
+        best = 0 if source == target else None
+        meeting = source if source == target else None
+        side = 0
+        while queues[0] or queues[1]:
+            if not queues[side]:
+                side = 1 - side
+            queue = queues[side]
+            d, u = heapq.heappop(queue)
+            if d > distances[side][u]:
+                continue
+            if best is not None and d >= best:
+                # Nothing this side still has can improve the best path
+                queue.clear()
+                side = 1 - side
+                continue
+            other = distances[1 - side].get(u)
+            if other is not None and (best is None or d + other < best):
+                best = d + other
+                meeting = u
+            distance = distances[side]
+            # Stall: a higher ranked segment already reaches u for less, so no shortest path goes on from u
+            for v, w, _ in stalls[side][u]:
+                if v in distance and distance[v] + w < d:
+                    break
+            else:
+                for v, w, middle in graphs[side][u]:
+                    if d + w < distance.get(v, d + w + 1):
+                        distance[v] = d + w
+                        parents[side][v] = (u, middle)
+                        heapq.heappush(queue, (d + w, v))
+            side = 1 - side
+        return meeting, best, forward, backward
+
+    def _unpack(self, edge: tuple[int, int, int], route: list[int]):
+        # Appends the segments after the first one of a hierarchy edge, replacing shortcuts by what they skip
+        stack = [edge]
+        while stack:
+            a, b, middle = stack.pop()
+            if middle < 0:
+                route.append(b)
+            else:
+                stack.append((middle, b, self._up_middle[middle][b]))
+                stack.append((a, middle, self._down_middle[middle][a]))
+
+
+def save_hierarchy(hierarchy: ContractionHierarchy, directory: str):
+    save_arrays({name: getattr(hierarchy, name) for name in ContractionHierarchy.arrays}, directory)
+
+
+def load_hierarchy(directory: str) -> ContractionHierarchy:
+    """ The hierarchy stored in directory, or None if there is none """
+    arrays = load_arrays(ContractionHierarchy.arrays, directory)
+    return ContractionHierarchy(arrays) if arrays is not None else None
+
+
+def cached_hierarchy(network: CompiledNetwork, cache_dir: str) -> ContractionHierarchy:
+    """ The hierarchy of network, stored in cache_dir next to the compiled network of the same roads """
+    directory = os.path.join(cache_dir, f"{road_key(network.roads)}.hierarchy{HIERARCHY_VERSION}")
+    hierarchy = load_hierarchy(directory)
+    if hierarchy is None:
+        hierarchy = ContractionHierarchy.build(network)
+        save_hierarchy(hierarchy, directory)
+    return hierarchy
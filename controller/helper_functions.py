@@ -1,39 +1,112 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from game_model.compiled_network import CompiledNetwork, TIE_SCALE
 from game_model.constants import *
 from game_model.helper_functions import dist
 from game_model.road_network import LaneSegment, CrossingSegment, Point, Segment
 
 
-def astar_heuristic(current_seg: Segment, goal_seg: LaneSegment):
-    mid_lane = BLOCK_SIZE // 2
-    match current_seg:
+def segment_center(segment: Segment) -> Point:
+    """ Same as CompiledNetwork.center_x and center_y """
+    match segment:
         case LaneSegment():
-            if goal_seg.lane.road.horizontal:
-                if current_seg.lane.road.horizontal:
-                    return dist(Point(current_seg.end, current_seg.lane.top),
-                                Point(goal_seg.begin, goal_seg.lane.top))
-                else:
-                    return dist(Point(current_seg.lane.top, current_seg.end),
-                                Point(goal_seg.begin, goal_seg.lane.top))
-            else:
-                if current_seg.lane.road.horizontal:
-                    return dist(Point(current_seg.end, current_seg.lane.top),
-                                Point(goal_seg.lane.top, goal_seg.begin))
-                else:
-                    return dist(Point(current_seg.lane.top, current_seg.end),
-                                Point(goal_seg.lane.top, goal_seg.begin))
+            along = (segment.begin + segment.end) / 2
+            across = segment.lane.top + BLOCK_SIZE / 2
+            return Point(along, across) if segment.lane.road.horizontal else Point(across, along)
         case CrossingSegment():
-            if goal_seg.lane.road.horizontal:
-                return dist(Point(current_seg.horiz_lane.top + mid_lane, current_seg.vert_lane.top + mid_lane),
-                            Point(goal_seg.begin, goal_seg.lane.top))
-            else:
-                return dist(Point(current_seg.horiz_lane.top + mid_lane, current_seg.vert_lane.top + mid_lane),
-                            Point(goal_seg.lane.top, goal_seg.begin))
-
-
-def reconstruct_path(came_from: dict[Segment, Segment],
-                     current: LaneSegment) -> list[Segment]:
-    path: list[Segment] = [current]
-    while current in came_from:
+            return Point(segment.vert_lane.top + BLOCK_SIZE / 2, segment.horiz_lane.top + BLOCK_SIZE / 2)
+
+
+# Neighbouring crossings lie LANE_DISPLACEMENT apart, a gap no segment length covers. Passing a crossing
+# takes the car at most BLOCK_SIZE + LANE_DISPLACEMENT closer for BLOCK_SIZE of cost.
+HEURISTIC_SCALE = BLOCK_SIZE / (BLOCK_SIZE + LANE_DISPLACEMENT)
+
+
+def astar_heuristic(current_seg: Segment, goal_seg: LaneSegment) -> float:
+    # From the end of current_seg to the start of goal_seg there is at least the straight line
+    # between their centres minus half of each, scaled so it never overestimates the remaining cost
+    return max(dist(segment_center(current_seg), segment_center(goal_seg))
+               - (current_seg.length + goal_seg.length) / 2, 0) * HEURISTIC_SCALE
+
+
+class GoalHeuristics:
+    """ astar_heuristic of every segment towards a goal, computed for all segments in one NumPy
+    expression over the network's centres and kept as an int64 array for the max_goals most recent goals,
+    8 bytes per segment and goal. The array is handed out as a memoryview, which indexes to plain ints.
+    The estimates are in the unit of the network's weights: whole lengths times TIE_SCALE.
+    Only the arrays of the network are kept, not the network, so goal_heuristics does not keep it alive. """
+
+    def __init__(self, network: CompiledNetwork, max_goals: int = 64) -> None:
+        self._center_x = network.center_x
+        self._center_y = network.center_y
+        self._length = network.length
+        self.max_goals = max_goals
+        # The weights as a list, indexing it is cheaper than indexing the array
+        self.weight = network.weight.tolist()
+        self._tables: OrderedDict[int, memoryview] = OrderedDict()
+
+    def __call__(self, goal: int) -> memoryview:
+        table = self._tables.get(goal)
+        if table is not None:
+            self._tables.move_to_end(goal)
+            return table
+        center_x, center_y, length = self._center_x, self._center_y, self._length
+        estimate = np.hypot(center_x - center_x[goal], center_y - center_y[goal]) - (length + length[goal]) / 2
+        estimate = np.floor(np.maximum(estimate, 0) * HEURISTIC_SCALE).astype(np.int64)
+        # Indexing the array would give NumPy scalars, slower to add and to compare in the open heap
+        table = self._tables[goal] = memoryview(estimate * TIE_SCALE)
+        if len(self._tables) > self.max_goals:
+            self._tables.popitem(last=False)
+        return table
+
+
+_heuristics = weakref.WeakKeyDictionary()
+
+
+def goal_heuristics(network: CompiledNetwork) -> GoalHeuristics:
+    """ The heuristic tables of network, shared by all controllers of the process """
+    heuristics = _heuristics.get(network)
+    if heuristics is None:
+        heuristics = _heuristics[network] = GoalHeuristics(network)
+    return heuristics
+
+
+def reconstruct_path(came_from: list[int], current: int) -> list[int]:
+    """ Segment ids from the start of the search to current, came_from is -1 at the start """
+    path = [current]
+    while came_from[current] >= 0:
         current = came_from[current]
-        path.insert(0, current)
+        path.append(current)
+    path.reverse()
     return path
+
+
+class SearchBuffers:
+    """ Per segment id scores of an A* search, reused by every search of a thread.
+    A slot only holds a value of the current search if its stamp is the current generation,
+    so a new search starts without clearing anything. """
+
+    def __init__(self, size: int) -> None:
+        self.generation = 0
+        self.stamp = [0] * size
+        self.g_score = [0] * size
+        self.came_from = [-1] * size
+
+    def start(self) -> int:
+        self.generation += 1
+        return self.generation
+
+
+_buffers = threading.local()
+
+
+def search_buffers(size: int) -> SearchBuffers:
+    """ The buffers of the calling thread, for a network of size segments """
+    buffers = getattr(_buffers, "buffers", None)
+    if buffers is None or len(buffers.stamp) != size:
+        buffers = _buffers.buffers = SearchBuffers(size)
+    return buffers
@@ -0,0 +1,115 @@
+import heapq
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from game_model.compiled_network import CompiledNetwork
+
+# Distance of the segments from which the goal cannot be reached
+UNREACHABLE = np.iinfo(np.int64).max
+
+
+class NextHopRouter:
+    """ Shortest-path next hops towards goal segments, one table per goal.
+    A table is built by one backward Dijkstra search from the goal and holds, for every segment id,
+    the id of the segment to enter next (-1 at the goal and where the goal cannot be reached).
+    Costs are the ones of AstarCarController.astar: leaving a segment costs its weight in the network,
+    whose ties make every shortest path unique, so the hops follow exactly the path astar finds.
+    Tables are kept in LRU order and the least recently used ones are dropped above max_bytes.
+    Only the arrays of the network are kept, not the network, so shared_router does not keep it alive. """
+
+    def __init__(self, network: CompiledNetwork, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self._size = len(network)
+        self._indptr = network.indptr
+        self._indices = network.indices
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tables: OrderedDict[int, np.ndarray] = OrderedDict()
+        # Predecessors in CSR form, for the backward search
+        n = len(network)
+        sources = np.repeat(np.arange(n), np.diff(network.indptr))
+        order = np.argsort(network.indices, kind="stable")
+        self._rev_indptr = np.searchsorted(network.indices[order], np.arange(n + 1)).tolist()
+        self._rev_indices = sources[order].tolist()
+        self._weight = network.weight.tolist()
+
+    def next_hop(self, segment: int, goal: int) -> int:
+        return int(self.table(goal)[segment])
+
+    def route(self, segment: int, goal: int) -> list[int]:
+        """ Segment ids from segment to goal, both included, or just segment if the goal cannot be reached """
+        table = self.table(goal)
+        route = [segment]
+        while (segment := int(table[segment])) >= 0:
+            route.append(segment)
+        return route
+
+    def table(self, goal: int) -> np.ndarray:
+        table = self._tables.get(goal)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(goal)
+            return table
+        self.misses += 1
+        table = self._build(goal)
+        self._tables[goal] = table
+        self.nbytes += table.nbytes
+        while self.nbytes > self.max_bytes and len(self._tables) > 1:
+            _, evicted = self._tables.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return table
+
+    def distances(self, goal: int) -> np.ndarray:
+        """ Cost from every segment to the goal, UNREACHABLE where it cannot be reached """
+        n = self._size
+        rev_indptr, rev_indices, weight = self._rev_indptr, self._rev_indices, self._weight
+        distance = [UNREACHABLE] * n
+        distance[goal] = 0
+        queue = [(0, goal)]
+        while queue:
+            d, i = heapq.heappop(queue)
+            if d > distance[i]:
+                continue
+            for k in range(rev_indptr[i], rev_indptr[i + 1]):
+                j = rev_indices[k]
+                if d + weight[j] < distance[j]:
+                    distance[j] = d + weight[j]
+                    heapq.heappush(queue, (distance[j], j))
+        return np.array(distance, dtype=np.int64)
+
+    def _build(self, goal: int) -> np.ndarray:
+        n = self._size
+        distance = self.distances(goal)
+        # Over every edge: the cost of the way through it, the successor with the lowest cost wins
+        # (the first one, should two ways still be equally short)
+        indptr, indices = self._indptr, self._indices
+        via = distance[indices]
+        has_edges = np.diff(indptr) > 0
+        starts = indptr[:-1][has_edges]
+        best = np.full(n, UNREACHABLE, dtype=np.int64)
+        best[has_edges] = np.minimum.reduceat(via, starts)
+        sources = np.repeat(np.arange(n), np.diff(indptr))
+        candidates = np.flatnonzero((via == best[sources]) & (via != UNREACHABLE))
+        # The first candidate edge of every segment
+        first = np.unique(sources[candidates], return_index=True)
+        table = np.full(n, -1, dtype=np.int32)
+        table[first[0]] = indices[candidates[first[1]]]
+        table[goal] = -1
+        return table
+
+    def __len__(self):
+        return len(self._tables)
+
+
+_routers = weakref.WeakKeyDictionary()
+
+
+def shared_router(network: CompiledNetwork) -> NextHopRouter:
+    """ The router of network, shared by all controllers of the process """
+    router = _routers.get(network)
+    if router is None:
+        router = _routers[network] = NextHopRouter(network)
+    return router
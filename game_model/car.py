@@ -1,9 +1,9 @@
-import numpy as np
-from pygame import Color
+from time import perf_counter
 
 from game_model.constants import *
+from game_model.event_log import EventType
 from game_model.road_network import LaneSegment, true_direction, Problem, CrossingSegment, Point, \
-    horiz_direction, right_direction, Segment
+    horiz_direction, right_direction, Segment, Color, Reservation
 
 
 class Car:
@@ -25,18 +25,21 @@ class Car:
         self.loc = loc
         self.max_speed = max_speed
         self.claimed_lane: dict = {}
-        self.parallel_res: list = []
+        self.parallel_res: list[Reservation] = []
         self.lane_change_counter: int = 0
         self.crossing_counter: int = 0
+        # TickProfiler of the game, set by TrafficEnv
+        self.profiler = None
+        # EventLog of the game, set by TrafficEnv
+        self.events = None
 
         self.claim: list = []
-        self.res: list = [{"seg": segment,
-                           "dir": self.direction,
-                           "turn": False,
-                           "begin": self.loc,
-                           "end": (1 if true_direction[self.direction] else -1) * self.get_braking_distance()}]
+        self.res: list[Reservation] = [Reservation(segment, self.direction, False, self.loc,
+                                                   (1 if true_direction[self.direction] else -1) *
+                                                   self.get_braking_distance())]
         segment.cars.append(self)
         self.extend_res()
+        self._index_res()
 
         # For gui only
         self.pos = Point(0, 0)
@@ -47,45 +50,59 @@ class Car:
 
     def move(self):
         # Within the lane
-        self.loc += (1 if true_direction[self.res[0]["dir"]] else -1) * self.speed
+        self.loc += (1 if true_direction[self.res[0].dir] else -1) * self.speed
+        return self.update_reservations()
 
+    def update_reservations(self):
+        # Follows loc after it was advanced, moving on to the next segments if needed
         # Cancel claimed lanes if the car enters a crossing
         if len(self.res) > 1 and len(self.claimed_lane) > 0:
             self.claimed_lane = {}
 
-        self.extend_res()
+        if self.profiler is not None and self.profiler.enabled:
+            start = perf_counter()
+            self.extend_res()
+            self.profiler.add("extend_res", perf_counter() - start)
+        else:
+            self.extend_res()
 
-        while abs(self.loc) > self.res[0]["seg"].length:
-            self.loc = (1 if true_direction[self.res[1]["dir"]] else -1) * (abs(self.loc) - self.res[0]["seg"].length)
+        while abs(self.loc) > self.res[0].seg.length:
+            # Drove off the end of the map
+            if len(self.res) == 1:
+                return Problem.NO_NEXT_SEGMENT
+            self.loc = (1 if true_direction[self.res[1].dir] else -1) * (abs(self.loc) - self.res[0].seg.length)
             seg_info = self.res.pop(0)
-            seg_info["seg"].cars.remove(self)
+            seg_info.seg.cars.remove(self)
+            seg_info.seg.intervals.remove(self)
             if self.parallel_res:
                 parallel_seg_info = self.parallel_res.pop(0)
-                parallel_seg_info["seg"].cars.remove(self)
-        if self.res[0]["turn"]:
+                parallel_seg_info.seg.cars.remove(self)
+                parallel_seg_info.seg.intervals.remove(self)
+        if self.res[0].turn:
             # self.loc = 0
-            self.res[0]["turn"] = False
+            self.res[0].turn = False
             if self.parallel_res:
-                self.parallel_res[0]["turn"] = False
+                self.parallel_res[0].turn = False
 
-        self.res[0]["begin"] = self.loc
+        self.res[0].begin = self.loc
         if self.parallel_res:
-            self.parallel_res[0]["begin"] = self.loc
+            self.parallel_res[0].begin = self.loc
 
         for i, seg in enumerate(self.res):
             if i < len(self.res) - 1:
-                seg["end"] = (1 if true_direction[seg["dir"]] else -1) * seg["seg"].length
+                seg.end = (1 if true_direction[seg.dir] else -1) * seg.seg.length
         for i, seg in enumerate(self.parallel_res):
             if i < len(self.parallel_res) - 1:
-                seg["end"] = (1 if true_direction[seg["dir"]] else -1) * seg["seg"].length
+                seg.end = (1 if true_direction[seg.dir] else -1) * seg.seg.length
 
         # Update the "end" of the last reserved segment
-        end = self.get_braking_distance() - sum([abs(self.res[i]["end"] - self.res[i]["begin"]) for i in
-                                                 range(len(self.res) - 1)])
-        self.res[-1]["end"] = (1 if true_direction[self.res[-1]["dir"]] else -1) * end + self.res[-1]["begin"]
+        end = self.get_braking_distance() - sum(abs(self.res[i].end - self.res[i].begin) for i in
+                                                range(len(self.res) - 1))
+        self.res[-1].end = (1 if true_direction[self.res[-1].dir] else -1) * end + self.res[-1].begin
         if self.parallel_res:
-            self.parallel_res[-1]["end"] = end + self.parallel_res[-1]["begin"]
+            self.parallel_res[-1].end = end + self.parallel_res[-1].begin
 
+        self._index_res()
         self._update_position()
         return True
 
@@ -93,54 +110,42 @@ class Car:
         if last_seg is None:
             last_seg = self.res[-1]
         if direction is None:
-            direction = self.res[-1]["dir"]
+            direction = self.res[-1].dir
 
-        if isinstance(last_seg["seg"], LaneSegment):
-            return last_seg["seg"].end_crossing
+        if isinstance(last_seg.seg, LaneSegment):
+            return last_seg.seg.end_crossing
         else:
-            return last_seg["seg"].connected_segments[direction]
+            return last_seg.seg.connected_segments[direction]
 
     def extend_res(self):
 
-        while abs(self.loc) + self.get_braking_distance() >= sum([seg["seg"].length for seg in self.res]):
+        while abs(self.loc) + self.get_braking_distance() >= sum(seg.seg.length for seg in self.res):
             next_seg = self.get_next_segment()
             parallel_next_seg = None
             if self.parallel_res:
                 parallel_next_seg = self.get_next_segment(self.parallel_res[-1])
             if next_seg is None and parallel_next_seg is None:
-                print("Problem.NO_NEXT_SEGMENT")
-                print(f"Problem car {self.name} loc {self.loc} speed {self.speed}")
-                for seg in self.res:
-                    print(f"{seg['seg']} {seg['begin']} {seg['end']}")
+                if self.events is not None:
+                    self.events.record(EventType.NO_NEXT_SEGMENT, self, problem=Problem.NO_NEXT_SEGMENT)
                 break
                 # return Problem.NO_NEXT_SEGMENT
             else:
                 extra = (1 if true_direction[self.direction] else -1) * (
-                        abs(self.loc) + self.get_braking_distance() - sum([seg["seg"].length for seg in self.res]))
-                next_seg_info = {"seg": next_seg,
-                                 "dir": self.direction,
-                                 "turn": False,
-                                 "begin": 0,
-                                 "end": extra}
-                self.res.append(next_seg_info)
+                        abs(self.loc) + self.get_braking_distance() - sum(seg.seg.length for seg in self.res))
+                self.res.append(Reservation(next_seg, self.direction, False, 0, extra))
                 next_seg.cars.append(self)
             if parallel_next_seg is not None:
-                next_parallel_seg_info = {"seg": parallel_next_seg,
-                                          "dir": self.direction,
-                                          "turn": False,
-                                          "begin": 0,
-                                          "end": extra}
-                self.parallel_res.append(next_parallel_seg_info)
+                self.parallel_res.append(Reservation(parallel_next_seg, self.direction, False, 0, extra))
                 parallel_next_seg.cars.append(self)
 
     def turn(self, new_direction):
 
-        if isinstance(self.res[-1]["seg"], CrossingSegment):
+        if isinstance(self.res[-1].seg, CrossingSegment):
             self.direction = new_direction
-            self.res[-1]["dir"] = self.direction
-            self.res[-1]["turn"] = True
+            self.res[-1].dir = self.direction
+            self.res[-1].turn = True
             if self.parallel_res:
-                self.parallel_res[-1]["turn"] = True
+                self.parallel_res[-1].turn = True
             return True
 
     def change_speed(self, speed_diff):
@@ -148,42 +153,44 @@ class Car:
         accumulated_res = 0
         i = 0
         for seg in self.res:
-            accumulated_res += abs(seg["end"]) - abs(seg["begin"])
+            accumulated_res += abs(seg.end) - abs(seg.begin)
             i += 1
             if accumulated_res > self.get_braking_distance():
                 break
         while len(self.res) > i:
+            # Trimmed from the end, so these are the car's last reservations of the segments
             seg = self.res.pop(i)
-            seg["seg"].cars.remove(self)
+            seg.seg.cars.remove(self)
+            seg.seg.intervals.remove(self, -1)
             if self.parallel_res:
                 seg = self.parallel_res.pop(i)
-                seg["seg"].cars.remove(self)
+                seg.seg.cars.remove(self)
+                seg.seg.intervals.remove(self, -1)
         return True
 
     def get_adjacent_lane_segment(self, lane_diff, lane_segment: LaneSegment = None) -> LaneSegment:
         if lane_segment is None:
-            lane_segment = self.res[0]["seg"]
+            lane_segment = self.res[0].seg
         actual_lane_diff = (-1 if right_direction[self.direction] else 1) * lane_diff
         num = lane_segment.lane.num
         lanes = lane_segment.lane.road.right_lanes if right_direction[self.direction] \
             else lane_segment.lane.road.left_lanes
         if 0 <= num + actual_lane_diff < len(lanes):
-            current_seg_num = self.res[0]["seg"].num
+            current_seg_num = self.res[0].seg.num
             return lanes[num + actual_lane_diff].segments[current_seg_num]
         return None
 
     def change_lane(self, lane_diff):
-        if isinstance(self.res[0]["seg"], LaneSegment) and \
+        if isinstance(self.res[0].seg, LaneSegment) and \
                 len(self.res) == 1:
             next_lane_seg = self.get_adjacent_lane_segment(lane_diff)
             if next_lane_seg is not None:
-                self.res[0]["seg"].cars.remove(self)
-                self.res[0] = {"seg": next_lane_seg,
-                               "dir": self.res[0]["dir"],
-                               "turn": False,
-                               "begin": self.res[0]["begin"],
-                               "end": self.res[0]["end"]}
-                self.res[0]["seg"].cars.append(self)
+                self.res[0].seg.cars.remove(self)
+                self.res[0].seg.intervals.remove(self)
+                self.res[0].seg = next_lane_seg
+                self.res[0].turn = False
+                self.res[0].seg.cars.append(self)
+                self._index_res()
 
                 self._update_position()
                 return True
@@ -245,36 +252,39 @@ class Car:
 
         # return Problem.CHANGE_LANE_WHILE_CROSSING
 
+    def _index_res(self):
+        # Keeps the interval indices of the reserved segments up to date,
+        # a segment reserved more than once gets one span per reservation
+        seen = []
+        for seg_info in self.res + self.parallel_res if self.parallel_res else self.res:
+            seg = seg_info.seg
+            seg.intervals.update(self, abs(seg_info.begin), abs(seg_info.end), seen.count(seg))
+            seen.append(seg)
+
     def _update_position(self):
         """ Returns the bottom left corner of the car """
-        seg, direction = self.res[0]["seg"], self.res[0]["dir"]
-        lane_seg = isinstance(seg, LaneSegment)
-        road = seg.lane.road if lane_seg \
-            else (seg.horiz_lane.road if horiz_direction[direction] else seg.vert_lane.road)
-
-        if lane_seg:
-            seg_begin = seg.begin
-        if road.horizontal:
-            if not lane_seg:
-                seg_begin = seg.vert_lane.top if true_direction[direction] else seg.vert_lane.top + BLOCK_SIZE
-            self.pos.y = seg.lane.top + self.lane_change_counter * (BLOCK_SIZE // LANE_CHANGE_STEPS) \
-                if lane_seg else seg.horiz_lane.top
-            self.pos.x = seg_begin + self.loc - (0 if true_direction[direction] else self.size)
-            # BLOCK_SIZE // 6 for the triangle
-            self.w = self.size - BLOCK_SIZE // 6
-            self.h = BLOCK_SIZE
-        else:
-            if not lane_seg:
-                seg_begin = seg.horiz_lane.top if true_direction[direction] else seg.horiz_lane.top + BLOCK_SIZE
-            self.pos.x = seg.lane.top + self.lane_change_counter * (BLOCK_SIZE // LANE_CHANGE_STEPS) \
-                if lane_seg else seg.vert_lane.top
-            self.pos.y = seg_begin + self.loc - (0 if true_direction[direction] else self.size)
-            # BLOCK_SIZE // 6 for the triangle
-            self.w = BLOCK_SIZE
-            self.h = self.size - BLOCK_SIZE // 6
+        self.pos.x, self.pos.y, self.w, self.h = car_geometry(self.res[0].seg, self.res[0].dir, self.loc, self.size,
+                                                              self.lane_change_counter)
+
+    def get_state(self) -> tuple:
+        """ The mutable state of the car as an immutable value, for set_state """
+        return (self.speed, self.dead, self.direction, self.loc, tuple(self.claimed_lane.items()),
+                tuple((r.seg, r.dir, r.turn, r.begin, r.end) for r in self.res),
+                tuple((r.seg, r.dir, r.turn, r.begin, r.end) for r in self.parallel_res),
+                self.lane_change_counter, self.crossing_counter, tuple(self.claim),
+                self.pos.x, self.pos.y, self.w, self.h)
+
+    def set_state(self, state: tuple):
+        """ Only the car itself, the segments keep their own record of the cars on them """
+        (self.speed, self.dead, self.direction, self.loc, claimed_lane, res, parallel_res,
+         self.lane_change_counter, self.crossing_counter, claim, self.pos.x, self.pos.y, self.w, self.h) = state
+        self.claimed_lane = dict(claimed_lane)
+        self.res = [Reservation(*r) for r in res]
+        self.parallel_res = [Reservation(*r) for r in parallel_res]
+        self.claim = list(claim)
 
     def get_center(self):
-        if horiz_direction[self.res[0]["dir"]]:
+        if horiz_direction[self.res[0].dir]:
             return Point(self.pos.x + self.size // 2, self.pos.y + BLOCK_SIZE // 2)
         else:
             return Point(self.pos.x + BLOCK_SIZE // 2, self.pos.y + self.size // 2)
@@ -288,7 +298,7 @@ class Car:
 
     def get_segment_info(self, segment):
         for seg in self.res:
-            if seg["seg"] == segment:
+            if seg.seg == segment:
                 return seg
 
     def get_size_segments(self):
@@ -297,16 +307,39 @@ class Car:
         i = 0
         while accumulated_size < self.size:
             seg_info = self.res[i]
-            begin = abs(seg_info["begin"])
-            end = abs(seg_info["end"])
+            begin = abs(seg_info.begin)
+            end = abs(seg_info.end)
             diff = end - begin
             remaining = min(diff, self.size - accumulated_size)
-            segments.append({
-                "seg": seg_info["seg"],
-                "begin": seg_info["begin"],
-                "end": seg_info["begin"] + (1 if true_direction[seg_info["dir"]] else -1) * remaining,
-                "dir": seg_info["dir"]
-            })
+            segments.append(Reservation(seg_info.seg, seg_info.dir, False, seg_info.begin,
+                                        seg_info.begin + (1 if true_direction[seg_info.dir] else -1) * remaining))
             accumulated_size += diff
             i += 1
         return segments
+
+
+def car_geometry(seg: Segment, direction, loc: int, size: int, lane_change_counter: int = 0) \
+        -> tuple[int, int, int, int]:
+    """ x, y (bottom left corner), width and height of a car on seg driving in direction, which is res[0] """
+    lane_seg = isinstance(seg, LaneSegment)
+    road = seg.lane.road if lane_seg \
+        else (seg.horiz_lane.road if horiz_direction[direction] else seg.vert_lane.road)
+
+    if lane_seg:
+        seg_begin = seg.begin
+    if road.horizontal:
+        if not lane_seg:
+            seg_begin = seg.vert_lane.top if true_direction[direction] else seg.vert_lane.top + BLOCK_SIZE
+        y = seg.lane.top + lane_change_counter * (BLOCK_SIZE // LANE_CHANGE_STEPS) \
+            if lane_seg else seg.horiz_lane.top
+        x = seg_begin + loc - (0 if true_direction[direction] else size)
+        # BLOCK_SIZE // 6 for the triangle
+        return x, y, size - BLOCK_SIZE // 6, BLOCK_SIZE
+    else:
+        if not lane_seg:
+            seg_begin = seg.horiz_lane.top if true_direction[direction] else seg.horiz_lane.top + BLOCK_SIZE
+        x = seg.lane.top + lane_change_counter * (BLOCK_SIZE // LANE_CHANGE_STEPS) \
+            if lane_seg else seg.vert_lane.top
+        y = seg_begin + loc - (0 if true_direction[direction] else size)
+        # BLOCK_SIZE // 6 for the triangle
+        return x, y, BLOCK_SIZE, size - BLOCK_SIZE // 6
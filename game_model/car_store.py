@@ -0,0 +1,164 @@
+import numpy as np
+
+from game_model.car import Car
+from game_model.constants import *
+from game_model.road_network import LaneSegment, Color, clock_wise, true_direction
+
+
+COLUMNS = ("speed", "loc", "max_speed", "size", "direction", "segment", "sign")
+
+
+class CarStore:
+    """ Struct-of-arrays state of a whole fleet, one row per car.
+    Cars created by the store are StoredCar views over their row, so the scalar game logic keeps working
+    while speed, position and braking updates can be done for all cars in one call. """
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.capacity = max(capacity, 1)
+        self.count = 0
+        self.cars: list[StoredCar] = []
+
+        self.speed = np.zeros(self.capacity, dtype=np.int64)
+        self.loc = np.zeros(self.capacity, dtype=np.int64)
+        self.max_speed = np.zeros(self.capacity, dtype=np.int64)
+        self.size = np.zeros(self.capacity, dtype=np.int64)
+        # Index into clock_wise
+        self.direction = np.zeros(self.capacity, dtype=np.int8)
+        # Id of the segment the car is on (res[0])
+        self.segment = np.full(self.capacity, -1, dtype=np.int64)
+        # +1 / -1, the sign loc moves with on the current segment
+        self.sign = np.ones(self.capacity, dtype=np.int64)
+
+    def create_car(self,
+                   name: str,
+                   loc: int,
+                   segment: LaneSegment,
+                   speed: int,
+                   size: int,
+                   color: Color,
+                   max_speed: int) -> "StoredCar":
+        if self.count == self.capacity:
+            self._grow()
+        car = StoredCar(self, self.count, name, loc, segment, speed, size, color, max_speed)
+        self.count += 1
+        self.cars.append(car)
+        return car
+
+    def clear(self):
+        self.count = 0
+        self.cars = []
+
+    def state(self) -> tuple:
+        """ Copies of the used rows, for set_state """
+        return self.count, tuple(self.cars), {column: getattr(self, column)[:self.count].copy() for column in COLUMNS}
+
+    def set_state(self, state: tuple):
+        self.count, cars, columns = state
+        self.cars = list(cars)
+        while self.capacity < self.count:
+            self._grow()
+        for column, values in columns.items():
+            getattr(self, column)[:self.count] = values
+
+    def braking_distances(self) -> np.ndarray:
+        speed = self.speed[:self.count]
+        # Same as Car.get_braking_distance
+        return self.size[:self.count] + (speed * (speed + 1)) // 2 + BLOCK_SIZE // 2
+
+    def change_speeds(self, speed_diffs) -> np.ndarray:
+        """ Only the speed columns, Car.change_speed also trims the reservations """
+        speed = self.speed[:self.count]
+        np.clip(speed + speed_diffs, 0, self.max_speed[:self.count], out=speed)
+        return speed
+
+    def advance(self, moving=None) -> np.ndarray:
+        """ Moves loc of every car (or every car in the boolean mask `moving`) by its speed """
+        step = self.sign[:self.count] * self.speed[:self.count]
+        if moving is not None:
+            step = np.where(moving, step, 0)
+        self.loc[:self.count] += step
+        return self.loc[:self.count]
+
+    def move_all(self, moving=None):
+        """ Car.move for the whole fleet: positions in one vectorized step, then the reservations per car """
+        self.advance(moving)
+        for row, car in enumerate(self.cars):
+            if moving is None or moving[row]:
+                car.update_reservations()
+
+    def _grow(self):
+        self.capacity *= 2
+        for column in COLUMNS:
+            old = getattr(self, column)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+
+
+class StoredCar(Car):
+    """ A Car whose scalar state lives in one row of a CarStore """
+
+    def __init__(self, store: CarStore, row: int, *args, **kwargs) -> None:
+        self._store = store
+        self._row = row
+        super().__init__(*args, **kwargs)
+
+    @property
+    def speed(self):
+        return int(self._store.speed[self._row])
+
+    @speed.setter
+    def speed(self, value):
+        self._store.speed[self._row] = value
+
+    @property
+    def loc(self):
+        return int(self._store.loc[self._row])
+
+    @loc.setter
+    def loc(self, value):
+        self._store.loc[self._row] = value
+
+    @property
+    def max_speed(self):
+        return int(self._store.max_speed[self._row])
+
+    @max_speed.setter
+    def max_speed(self, value):
+        self._store.max_speed[self._row] = value
+
+    @property
+    def size(self):
+        return int(self._store.size[self._row])
+
+    @size.setter
+    def size(self, value):
+        self._store.size[self._row] = value
+
+    @property
+    def direction(self):
+        return clock_wise[self._store.direction[self._row]]
+
+    @direction.setter
+    def direction(self, value):
+        self._store.direction[self._row] = clock_wise.index(value)
+
+    def turn(self, new_direction):
+        result = super().turn(new_direction)
+        # A car with a single reservation turns the crossing it is on
+        self._update_row()
+        return result
+
+    def change_lane(self, lane_diff):
+        result = super().change_lane(lane_diff)
+        self._update_row()
+        return result
+
+    def _update_position(self):
+        super()._update_position()
+        self._update_row()
+
+    def _update_row(self):
+        # The columns that follow res[0]
+        self._store.segment[self._row] = self.res[0].seg.id
+        self._store.sign[self._row] = 1 if true_direction[self.res[0].dir] else -1
@@ -0,0 +1,66 @@
+import numpy as np
+
+from game_model.car import Car
+
+
+def size_spans(cars: list[Car]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Segment ids, absolute begins and ends, and car indices of the occupied parts of all cars """
+    seg, begin, end, owner = [], [], [], []
+    for i, car in enumerate(cars):
+        first = car.res[0]
+        first_begin = abs(first.begin)
+        if abs(first.end) - first_begin >= car.size:
+            # Most cars are completely on their first segment, same as get_size_segments without the records
+            seg.append(first.seg.id)
+            begin.append(first_begin)
+            end.append(first_begin + car.size)
+            owner.append(i)
+        else:
+            for segment in car.get_size_segments():
+                seg.append(segment.seg.id)
+                begin.append(abs(segment.begin))
+                end.append(abs(segment.end))
+                owner.append(i)
+    return tuple(np.array(column, dtype=np.int64) for column in (seg, begin, end, owner))
+
+
+def span_collisions(seg: np.ndarray, begin: np.ndarray, end: np.ndarray, owner: np.ndarray) -> np.ndarray:
+    """ The (k, 2) array of colliding owner pairs (smaller index first, no duplicates).
+    Two spans on the same segment collide if an end point of one lies strictly inside the other,
+    the same rule as collision_check, applied both ways. """
+    low = np.minimum(begin, end)
+    high = np.maximum(begin, end)
+    order = np.lexsort((low, seg))
+    seg, low, high, begin, end, owner = (a[order] for a in (seg, low, high, begin, end, owner))
+
+    found = []
+    # Compare every span with its d-th successor. Once a successor starts after the span ends,
+    # all later ones do too, so the candidates shrink with every step.
+    candidates = np.arange(len(seg) - 1)
+    d = 1
+    while len(candidates) > 0:
+        candidates = candidates[candidates + d < len(seg)]
+        i, j = candidates, candidates + d
+        active = (seg[i] == seg[j]) & (low[j] < high[i])
+        i, j = i[active], j[active]
+        hit = (((begin[i] < begin[j]) & (begin[j] < end[i])) |
+               ((begin[i] < end[j]) & (end[j] < end[i])) |
+               ((begin[j] < begin[i]) & (begin[i] < end[j])) |
+               ((begin[j] < end[i]) & (end[i] < end[j]))) & (owner[i] != owner[j])
+        found.append(np.stack((owner[i[hit]], owner[j[hit]]), axis=1))
+        candidates = i
+        d += 1
+
+    if not found:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.concatenate(found)
+    pairs.sort(axis=1)
+    # Unique pairs through a single integer key per pair
+    base = int(owner.max()) + 1
+    keys = np.unique(pairs[:, 0] * base + pairs[:, 1])
+    return np.stack(np.divmod(keys, base), axis=1)
+
+
+def collision_pairs_vectorized(cars: list[Car]) -> set[tuple[int, int]]:
+    """ Same result as collision_pairs, computed with array operations """
+    return set(map(tuple, span_collisions(*size_spans(cars)).tolist()))
@@ -0,0 +1,177 @@
+import numpy as np
+
+from game_model.constants import *
+from game_model.road_network import Road, Lane, Segment, LaneSegment, CrossingSegment, clock_wise
+
+# Values of CompiledNetwork.kind
+LANE_SEGMENT = 0
+CROSSING_SEGMENT = 1
+
+# Routing weights are lengths times TIE_SCALE plus a tie value below TIE_SCALE / segments,
+# so the ties of a path never add up to a whole length unit
+TIE_SCALE = 1 << 40
+
+
+def road_lanes(roads: list[Road]) -> list[Lane]:
+    """ All lanes in a fixed order, their positions in this list are the lane ids of a compiled network """
+    return [lane for road in roads for lane in road.right_lanes + road.left_lanes]
+
+
+class CompiledNetwork:
+    """ Array form of the segment graph. Row i belongs to segments[i], whose id create_segments set to i.
+    The successors of segment i are indices[indptr[i]:indptr[i + 1]], entered in the direction
+    clock_wise[edge_direction[k]], in the order get_next_segment and A* see them. """
+
+    # The arrays that make up a compiled network, everything else is derived from the segments
+    arrays = ("kind", "length", "max_speed", "x", "y", "width", "height", "indptr", "indices", "edge_direction",
+              "lane", "lane_num", "cross_lane", "cross_num", "begin", "end")
+
+    def __init__(self, roads: list[Road], segments: list[Segment]) -> None:
+        self.roads = roads
+        self._segments = segments
+        n = len(segments)
+        lane_ids = {lane: i for i, lane in enumerate(road_lanes(roads))}
+
+        self.kind = np.zeros(n, dtype=np.int8)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.max_speed = np.zeros(n, dtype=np.int64)
+        # Bounding rectangle of every segment in world coordinates
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        self.width = np.zeros(n, dtype=np.int64)
+        self.height = np.zeros(n, dtype=np.int64)
+        # The lane of a lane segment, or the horizontal lane of a crossing, and the position in its segments.
+        # cross_lane and cross_num are the vertical lane of a crossing, -1 for lane segments.
+        self.lane = np.zeros(n, dtype=np.int64)
+        self.lane_num = np.zeros(n, dtype=np.int64)
+        self.cross_lane = np.full(n, -1, dtype=np.int64)
+        self.cross_num = np.full(n, -1, dtype=np.int64)
+        # begin and end of lane segments, 0 for crossings
+        self.begin = np.zeros(n, dtype=np.int64)
+        self.end = np.zeros(n, dtype=np.int64)
+
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        indices = []
+        edge_direction = []
+        for i, segment in enumerate(segments):
+            self.length[i] = segment.length
+            self.max_speed[i] = segment.max_speed
+            match segment:
+                case LaneSegment():
+                    self.kind[i] = LANE_SEGMENT
+                    self.lane[i] = lane_ids[segment.lane]
+                    self.lane_num[i] = segment.num
+                    self.begin[i] = segment.begin
+                    self.end[i] = segment.end
+                    low = min(segment.begin, segment.end)
+                    if segment.lane.road.horizontal:
+                        self.x[i], self.y[i] = low, segment.lane.top
+                        self.width[i], self.height[i] = segment.length, BLOCK_SIZE
+                    else:
+                        self.x[i], self.y[i] = segment.lane.top, low
+                        self.width[i], self.height[i] = BLOCK_SIZE, segment.length
+                    if segment.end_crossing is not None:
+                        indices.append(segment.end_crossing.id)
+                        edge_direction.append(clock_wise.index(segment.lane.direction))
+                case CrossingSegment():
+                    self.kind[i] = CROSSING_SEGMENT
+                    self.lane[i] = lane_ids[segment.horiz_lane]
+                    self.lane_num[i] = segment.horiz_num
+                    self.cross_lane[i] = lane_ids[segment.vert_lane]
+                    self.cross_num[i] = segment.vert_num
+                    self.x[i], self.y[i] = segment.vert_lane.top, segment.horiz_lane.top
+                    self.width[i] = self.height[i] = BLOCK_SIZE
+                    for direction, next_segment in segment.connected_segments.items():
+                        if next_segment is not None:
+                            indices.append(next_segment.id)
+                            edge_direction.append(clock_wise.index(direction))
+            self.indptr[i + 1] = len(indices)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.edge_direction = np.array(edge_direction, dtype=np.int8)
+        self._derive_geometry()
+        self._derive_weights()
+
+    @classmethod
+    def from_arrays(cls, roads: list[Road], arrays: dict[str, np.ndarray]) -> "CompiledNetwork":
+        """ A network over previously compiled arrays (possibly memory-mapped).
+        The segment objects are only built when they are first needed, on the lanes of roads. """
+        network = cls.__new__(cls)
+        network.roads = roads
+        network._segments = None
+        for name in cls.arrays:
+            setattr(network, name, arrays[name])
+        network._derive_geometry()
+        network._derive_weights()
+        return network
+
+    @property
+    def segments(self) -> list[Segment]:
+        if self._segments is None:
+            self._segments = self._build_segments()
+        return self._segments
+
+    def __len__(self):
+        return len(self.kind)
+
+    def neighbors(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def _derive_geometry(self):
+        # The world reaches from the origin to the far sides of the outermost segments
+        self.world_width = int((self.x + self.width).max()) if len(self) > 0 else 0
+        self.world_height = int((self.y + self.height).max()) if len(self) > 0 else 0
+        # Centre of every segment, for distance estimates
+        self.center_x = self.x + self.width / 2
+        self.center_y = self.y + self.height / 2
+
+    def _derive_weights(self):
+        # Fixed pseudo-random ties (splitmix64 of the segment id) make shortest paths unique,
+        # so every router agrees on the path and not only on its length
+        n = len(self)
+        z = np.arange(n, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+        ties = (z % np.uint64(TIE_SCALE // max(n, 1))).astype(np.int64)
+        # Cost of leaving a segment, the unit of every shortest path search
+        self.weight = self.length * TIE_SCALE + ties
+
+    def _build_segments(self) -> list[Segment]:
+        # The same objects create_segments makes, without searching the roads for crossings
+        lanes = road_lanes(self.roads)
+        kind, lane, lane_num = self.kind.tolist(), self.lane.tolist(), self.lane_num.tolist()
+        cross_lane, cross_num = self.cross_lane.tolist(), self.cross_num.tolist()
+        begin, end = self.begin.tolist(), self.end.tolist()
+
+        lane_sizes = np.zeros(len(lanes), dtype=np.int64)
+        np.maximum.at(lane_sizes, self.lane, self.lane_num + 1)
+        crossings = self.cross_lane >= 0
+        np.maximum.at(lane_sizes, self.cross_lane[crossings], self.cross_num[crossings] + 1)
+        for lane_obj, size in zip(lanes, lane_sizes.tolist()):
+            lane_obj.segments = [None] * size
+
+        segments = []
+        for i in range(len(kind)):
+            if kind[i] == LANE_SEGMENT:
+                segment = LaneSegment(lanes[lane[i]], begin[i], end[i])
+                segment.num = lane_num[i]
+            else:
+                segment = CrossingSegment(lanes[lane[i]], lanes[cross_lane[i]])
+                segment.horiz_num = lane_num[i]
+                segment.vert_num = cross_num[i]
+                lanes[cross_lane[i]].segments[cross_num[i]] = segment
+            lanes[lane[i]].segments[lane_num[i]] = segment
+            segment.id = i
+            segments.append(segment)
+
+        indptr, indices, edge_direction = self.indptr.tolist(), self.indices.tolist(), self.edge_direction.tolist()
+        for i, segment in enumerate(segments):
+            for k in range(indptr[i], indptr[i + 1]):
+                if kind[i] == LANE_SEGMENT:
+                    segment.end_crossing = segments[indices[k]]
+                else:
+                    segment.connected_segments[clock_wise[edge_direction[k]]] = segments[indices[k]]
+        return segments
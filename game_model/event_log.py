@@ -0,0 +1,116 @@
+import json
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+
+from game_model.road_network import Problem
+
+
+class EventType(Enum):
+    CRASH = 1
+    ILLEGAL_ACTION = 2
+    NO_NEXT_SEGMENT = 3
+    GOAL_REACHED = 4
+
+
+# (segment id, begin, end) of every reservation of a car
+ResSnapshot = tuple[tuple[int, int, int], ...]
+
+
+@dataclass(slots=True, frozen=True)
+class Event:
+    type: EventType
+    tick: int
+    car: str
+    loc: int
+    speed: int
+    res: ResSnapshot
+    # The other car of a crash
+    other: str = None
+    other_res: ResSnapshot = None
+    problem: Problem = None
+
+    def to_dict(self) -> dict:
+        return {"type": self.type.name,
+                "tick": self.tick,
+                "car": self.car,
+                "loc": self.loc,
+                "speed": self.speed,
+                "res": self.res,
+                "other": self.other,
+                "other_res": self.other_res,
+                "problem": self.problem.name if self.problem is not None else None}
+
+    def __str__(self):
+        text = f"{self.type.name} tick {self.tick} car {self.car} loc {self.loc} speed {self.speed} res {self.res}"
+        if self.other is not None:
+            text += f" other {self.other} res {self.other_res}"
+        if self.problem is not None:
+            text += f" {self.problem.name}"
+        return text
+
+
+def snapshot(car) -> ResSnapshot:
+    return tuple((seg.seg.id, seg.begin, seg.end) for seg in car.res)
+
+
+class EventLog:
+    """ The last `capacity` events of a game, instead of printing them.
+    The caller takes them out with drain(). Optionally a background thread also appends every event
+    as a JSON line to a file, the formatting then happens off the simulation thread. """
+
+    def __init__(self, capacity: int = 10_000, echo: bool = False) -> None:
+        self._events: deque[Event] = deque(maxlen=capacity)
+        # Events pushed out of the full buffer before they were drained
+        self.dropped = 0
+        # Set by the game, stamped on every event
+        self.tick = 0
+        # Print every event, like the game used to
+        self.echo = echo
+        self._queue = None
+        self._writer = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, event_type: EventType, car, other=None, problem: Problem = None):
+        event = Event(event_type, self.tick, car.name, car.loc, car.speed, snapshot(car),
+                      other.name if other is not None else None,
+                      snapshot(other) if other is not None else None,
+                      problem)
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        if self._queue is not None:
+            self._queue.put(event)
+        if self.echo:
+            print(event)
+
+    def drain(self) -> list[Event]:
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+    def start_writer(self, path: str):
+        """ Appends every event recorded from now on to path, one JSON object per line """
+        self.stop_writer()
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write, args=(path, self._queue), daemon=True)
+        self._writer.start()
+
+    def stop_writer(self):
+        """ Writes the remaining events and waits for the writer thread """
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._queue = None
+        self._writer = None
+
+    @staticmethod
+    def _write(path: str, events: queue.SimpleQueue):
+        with open(path, "a") as file:
+            while (event := events.get()) is not None:
+                file.write(json.dumps(event.to_dict()) + "\n")
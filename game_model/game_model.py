@@ -1,22 +1,66 @@
 import random
+from dataclasses import dataclass
+from time import perf_counter
 
 from game_model.car import Car
+from game_model.car_store import CarStore
+from game_model.compiled_network import CompiledNetwork
+from game_model.network_cache import cached_network
+from game_model.collision_kernel import collision_pairs_vectorized
+from game_model.event_log import EventLog, EventType
+from game_model.profiler import TickProfiler
+from game_model.spawn import SpawnAllocator
 from game_model.road_network import Goal, Road, CrossingSegment, LaneSegment, Problem, clock_wise
-from game_model.helper_functions import create_random_car, overlap, create_segments, reached_goal, collision_check
+from game_model.helper_functions import create_random_car, overlap, create_segments, reached_goal, collision_check, \
+    collision_pairs
 from game_model.constants import *
 
 
+@dataclass(slots=True, frozen=True)
+class EnvSnapshot:
+    cars: tuple
+    car_states: tuple
+    # (segment, occupancy state, interval state) of every segment reserved by a car
+    segments: tuple
+    scores: tuple
+    goals: tuple
+    useless_iterations: tuple
+    tick: int
+    random_state: tuple
+    store: tuple
+
+
 class TrafficEnv:
-    def __init__(self, roads: list[Road], players: int, cars: list[Car] = None):
+    def __init__(self, roads: list[Road], players: int, cars: list[Car] = None, array_backed: bool = False,
+                 vectorized_collisions: bool = False, cache_dir: str = None, profile: bool = False,
+                 network: CompiledNetwork = None):
         super().__init__()
         self.roads = roads
-        self.segments = create_segments(roads)
+        # A given network must be compiled from these roads, its segments belong to this game alone.
+        # With a cache_dir the compiled network is loaded from disk when these roads were compiled before
+        if network is not None:
+            self.network = network
+        elif cache_dir is not None:
+            self.network = cached_network(roads, cache_dir)
+        else:
+            self.network = CompiledNetwork(roads, create_segments(roads))
+        self.segments = self.network.segments
+        self.spawn = SpawnAllocator(roads, self.segments)
         self.players = players
 
         self.cars = cars
+        # Optional struct-of-arrays storage of the car state, for fleet-wide vectorized updates
+        self.store = CarStore(players) if array_backed else None
+        # NumPy collision kernel instead of the per-segment sweep, pays off for large fleets
+        self.vectorized_collisions = vectorized_collisions
 
         self.n_actions = 3
 
+        # Time spent per phase of a tick, can be switched on and off at any time
+        self.profiler = TickProfiler(enabled=profile)
+        # Crashes, illegal actions and reached goals, drained by the caller
+        self.events = EventLog()
+
         # init display
         self.gui = None
         self.moved = True
@@ -29,17 +73,64 @@ class TrafficEnv:
         self.goals: list[Goal] = [None] * self.players
         self.useless_iterations: list[int] = [0] * self.players
         self.cars = []
+        # Cars of the previous episode must not block the new ones
+        for segment in self.segments:
+            segment.cars.clear()
+            segment.intervals.clear()
+        if self.store is not None:
+            self.store.clear()
+        self.spawn.reset()
         for i in range(self.players):
-            self.cars.append(create_random_car(self.segments, self.cars))
+            self.cars.append(create_random_car(self.spawn, self.store))
+            self.cars[i].profiler = self.profiler
+            self.cars[i].events = self.events
         for i in range(self.players):
             self._place_goal(i)
 
+    def snapshot(self) -> EnvSnapshot:
+        """ The mutable state of the episode as an immutable value, restore can apply it any number of times.
+        Only segments reserved by a car are copied, so the cost grows with the cars and not with the network.
+        Spawn pools are left out, they only change on reset. """
+        return EnvSnapshot(cars=tuple(self.cars),
+                           car_states=tuple(car.get_state() for car in self.cars),
+                           segments=tuple((seg, seg.cars.state(), seg.intervals.state())
+                                          for seg in self._reserved_segments()),
+                           scores=tuple(self.scores),
+                           goals=tuple(goal.lane_segment for goal in self.goals),
+                           useless_iterations=tuple(self.useless_iterations),
+                           tick=self.events.tick,
+                           random_state=random.getstate(),
+                           store=self.store.state() if self.store is not None else None)
+
+    def restore(self, snapshot: EnvSnapshot):
+        """ Puts the episode back into the state of the snapshot, in place """
+        for seg in self._reserved_segments():
+            seg.cars.clear()
+            seg.intervals.clear()
+        for seg, cars, intervals in snapshot.segments:
+            seg.cars.set_state(cars)
+            seg.intervals.set_state(intervals)
+        self.cars = list(snapshot.cars)
+        for car, state in zip(self.cars, snapshot.car_states):
+            car.set_state(state)
+        if self.store is not None:
+            self.store.set_state(snapshot.store)
+        self.scores = list(snapshot.scores)
+        for goal, lane_segment in zip(self.goals, snapshot.goals):
+            if goal.lane_segment is not lane_segment:
+                goal.lane_segment = lane_segment
+                goal.update_position()
+        self.useless_iterations = list(snapshot.useless_iterations)
+        self.events.tick = snapshot.tick
+        random.setstate(snapshot.random_state)
+
+    def _reserved_segments(self) -> set:
+        return {seg_info.seg for car in self.cars for seg_info in car.res + car.parallel_res}
+
     def _place_goal(self, player):
         self.useless_iterations[player] = 0
 
-        road = random.choice(self.roads)
-        lane = random.choice(road.right_lanes + road.left_lanes)
-        lane_segment = random.choice([seg for seg in lane.segments if isinstance(seg, LaneSegment)])
+        lane_segment = self.spawn.goal_segment()
         if self.goals[player] is None:
             self.goals[player] = Goal(lane_segment, self.cars[player].color)
         else:
@@ -47,53 +138,105 @@ class TrafficEnv:
             self.goals[player].update_position()
 
     def play_step(self, player, action):
-        self.useless_iterations[player] += 1
         car = self.cars[player]
-        game_over = False
 
         # Execute selected action
-        moved = self._move(player, action)  # update the head
+        if self._act(player, action):
+            return True, self.scores[player]
+
+        # Crash detection:
+        if self.profiler.enabled:
+            start = perf_counter()
+            other_car = collision_check(car)
+            self.profiler.add("crash", perf_counter() - start)
+        else:
+            other_car = collision_check(car)
+        if other_car is not None:
+            self._report_crash(car, other_car)
+            car.dead = True
+            return True, self.scores[player]
+
+        return self._check_goal(player), self.scores[player]
+
+    def step_all(self, actions):
+        # Advances every car that is still in the game by one tick.
+        # actions[player] is ignored for dead cars, so it may be None there.
+        self.events.tick += 1
+        game_over = [car.dead for car in self.cars]
+        for player, action in enumerate(actions):
+            if not game_over[player]:
+                game_over[player] = self._act(player, action)
+
+        # Crash detection once all cars moved
+        if self.profiler.enabled:
+            start = perf_counter()
+            pairs = self.detect_collisions()
+            self.profiler.add("crash", perf_counter() - start)
+        else:
+            pairs = self.detect_collisions()
+        for i, j in pairs:
+            self._report_crash(self.cars[i], self.cars[j])
+            self.cars[i].dead = self.cars[j].dead = True
+            game_over[i] = game_over[j] = True
+
+        for player in range(self.players):
+            if not game_over[player]:
+                game_over[player] = self._check_goal(player)
+        return game_over, self.scores.copy()
+
+    def detect_collisions(self) -> set[tuple[int, int]]:
+        """ The pairs of players whose cars collide, leaving out crashes of the past """
+        pairs = collision_pairs_vectorized(self.cars) if self.vectorized_collisions else collision_pairs(self.cars)
+        return {(i, j) for i, j in pairs if not (self.cars[i].dead and self.cars[j].dead)}
+
+    def _act(self, player, action) -> bool:
+        self.useless_iterations[player] += 1
+        car = self.cars[player]
+
+        if self.profiler.enabled:
+            start = perf_counter()
+            moved = self._move(player, action)  # update the head
+            self.profiler.add("dispatch", perf_counter() - start)
+        else:
+            moved = self._move(player, action)  # update the head
 
         # Check if the action was possible
         if isinstance(moved, Problem):
-            game_over = True
             car.dead = True
-            print(f"Illegal Action: {car.color} {car.pos}")
-            print(moved)
-            return game_over, self.scores[player]
+            self.events.record(EventType.ILLEGAL_ACTION, car, problem=moved)
+            return True
+        return False
 
-        # Crash detection:
-        for other_car in self.cars:
-            if other_car != car:
-                # if overlap(car.pos, car.w, car.h,
-                #            other_car.pos, other_car.w, other_car.h):
-                if collision_check(car):
-                    print("Crash:")
-                    print(f"First car {car.name} loc {car.loc} speed {car.speed}")
-                    for seg in car.res:
-                        print(f"{seg['seg']} {seg['begin']} {seg['end']}")
-                    print(f"Second car {other_car.name} loc {other_car.loc} speed {other_car.speed}")
-                    for seg in other_car.res:
-                        print(f"{seg['seg']} {seg['begin']} {seg['end']}")
-                    print("___________________________________________________________________________")
-                    game_over = True
-                    car.dead = True
-                    return game_over, self.scores[player]
+    def _report_crash(self, car, other_car):
+        self.events.record(EventType.CRASH, car, other=other_car)
+
+    def stats(self, reset: bool = False) -> dict[str, dict[str, float]]:
+        """ Time per phase of the ticks since the last reset, see TickProfiler.stats """
+        return self.profiler.stats(reset)
+
+    def _check_goal(self, player) -> bool:
+        if self.profiler.enabled:
+            start = perf_counter()
+            game_over = self._reach_goal(player)
+            self.profiler.add("goal", perf_counter() - start)
+            return game_over
+        return self._reach_goal(player)
+
+    def _reach_goal(self, player) -> bool:
+        car = self.cars[player]
 
         # Place new goal if the goal is reached
         if reached_goal(car, self.goals[player]):
             self.scores[player] += 1
+            self.events.record(EventType.GOAL_REACHED, car)
             self._place_goal(player)
             # print(f"Player {player}: Score {self.scores[player]}")
 
         # Player won!
         if self.scores[player] > 100:
-            game_over = True
             car.dead = True
-            return game_over, self.scores[player]
-
-        # 7. return game over and score
-        return game_over, self.scores[player]
+            return True
+        return False
 
     def _move(self, player, action):
         # -1, 0, 1 just acceleration
@@ -155,7 +298,12 @@ class TrafficEnv:
                 if not action_worked:
                     return action_worked
 
-        action_worked = car.move()
+        if self.profiler.enabled:
+            start = perf_counter()
+            action_worked = car.move()
+            self.profiler.add("move", perf_counter() - start)
+        else:
+            action_worked = car.move()
         return action_worked
 
     def is_collision(self, player, pt=None) -> bool:
@@ -163,7 +311,7 @@ class TrafficEnv:
         if pt is None:
             pt = self.cars[player].pos
         # hits boundary
-        if pt.x > WINDOW_WIDTH - 1 or pt.x < 0 or pt.y > WINDOW_HEIGHT - 1 or pt.y < 0:
+        if pt.x > self.network.world_width - 1 or pt.x < 0 or pt.y > self.network.world_height - 1 or pt.y < 0:
             return True
         # hits other cars
         if any([overlap(pt,
@@ -1,16 +1,15 @@
+import math
 import random
 import string
 
-import numpy as np
-
 from game_model.constants import *
 from game_model.car import Car
 from game_model.road_network import Direction, Road, CrossingSegment, LaneSegment, true_direction, Goal, Segment
-from gui.colors import colors
+from game_model.spawn import SpawnAllocator
 
 
 def dist(p1, p2):
-    return np.linalg.norm([p1.x - p2.x, p1.y - p2.y])
+    return math.hypot(p1.x - p2.x, p1.y - p2.y)
 
 
 def overlap(p1, w1, h1, p2, w2, h2):
@@ -26,20 +25,15 @@ def overlap(p1, w1, h1, p2, w2, h2):
 
 
 def reached_goal(car: Car, goal: Goal):
-    if car.res[0]["seg"] == goal.lane_segment:
+    if car.res[0].seg == goal.lane_segment:
         if dist(car.get_center(), goal.pos) < car.size // 2 + BLOCK_SIZE // 2:
             return True
     return False
 
 
-def create_random_car(segments: list[Segment], cars) -> Car:
-    name = random.choice([color for color in colors.keys()
-                          if not any([car.name == color for car in cars])])
-    color = colors[name]
-
-    lane_segment = random.choice([seg for seg in segments
-                                  if isinstance(seg, LaneSegment) and
-                                  not any([seg == car.res[0]["seg"] for car in cars])])
+def create_random_car(spawn: SpawnAllocator, store=None) -> Car:
+    name, color = spawn.take_name()
+    lane_segment = spawn.take_segment()
 
     max_speed = random.randint(BLOCK_SIZE // 4, BLOCK_SIZE // 2)
     speed = random.randint(BLOCK_SIZE // 10, max_speed)
@@ -47,13 +41,14 @@ def create_random_car(segments: list[Segment], cars) -> Car:
     size = random.randint(BLOCK_SIZE // 2, 3 * BLOCK_SIZE // 2)
     loc = 0
 
-    return Car(name=name,
-               loc=loc,
-               segment=lane_segment,
-               speed=speed,
-               size=size,
-               color=color,
-               max_speed=max_speed)
+    create_car = Car if store is None else store.create_car
+    return create_car(name=name,
+                      loc=loc,
+                      segment=lane_segment,
+                      speed=speed,
+                      size=size,
+                      color=color,
+                      max_speed=max_speed)
 
 
 def create_segments(roads: list[Road]):
@@ -142,22 +137,56 @@ def create_segments(roads: list[Road]):
                                 # if isinstance(lane.segments[j - 1], CrossingSegment):
                                 #     lane.segments[j - 1].up = lane.segments[j]
 
+    # Dense ids, used to index per-segment arrays
+    for i, segment in enumerate(segments):
+        segment.id = i
+
     return segments
 
 
 def collision_check(car: Car):
+    """ Returns a car whose occupied part collides with the one of car, or None """
     for segment in car.get_size_segments():
-        begin = abs(segment["begin"])
-        end = abs(segment["end"])
-        for other_car in segment["seg"].cars:
-            if other_car != car:
-                for other_seg in other_car.get_size_segments():
-                    if other_seg["seg"] == segment["seg"]:
-                        o_begin = abs(other_seg["begin"])
-                        o_end = abs(other_seg["end"])
-                        if begin < o_begin < end:
-                            return True
-                        elif begin < o_end < end:
-                            return True
-
-    return False
\ No newline at end of file
+        begin = abs(segment.begin)
+        end = abs(segment.end)
+        # The occupied part of a car lies within its reservation, so only overlapping reservations can collide
+        for other_car in segment.seg.intervals.overlapping(begin, end, exclude=car):
+            for other_seg in other_car.get_size_segments():
+                if other_seg.seg == segment.seg:
+                    o_begin = abs(other_seg.begin)
+                    o_end = abs(other_seg.end)
+                    if begin < o_begin < end:
+                        return other_car
+                    elif begin < o_end < end:
+                        return other_car
+
+    return None
+
+
+def collision_pairs(cars: list[Car]) -> set[tuple[int, int]]:
+    """ All pairs (i, j), i < j, of indices into cars for which collision_check finds a collision either way """
+    # Broad phase: the occupied ranges bucketed by segment
+    buckets: dict[Segment, list] = {}
+    for i, car in enumerate(cars):
+        for segment in car.get_size_segments():
+            begin = abs(segment.begin)
+            end = abs(segment.end)
+            buckets.setdefault(segment.seg, []).append((min(begin, end), begin, end, i))
+
+    # Exact phase: sweep over the ranges of each segment ordered by their lower end
+    pairs = set()
+    for spans in buckets.values():
+        if len(spans) < 2:
+            continue
+        spans.sort()
+        for a in range(len(spans) - 1):
+            _, begin, end, i = spans[a]
+            upper = max(begin, end)
+            for b in range(a + 1, len(spans)):
+                low, o_begin, o_end, j = spans[b]
+                if low >= upper:
+                    break
+                if i != j and (begin < o_begin < end or begin < o_end < end or
+                               o_begin < begin < o_end or o_begin < end < o_end):
+                    pairs.add((min(i, j), max(i, j)))
+    return pairs
@@ -0,0 +1,96 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class IntervalIndex:
+    """ The reserved [begin, end] ranges of the cars on one segment, sorted by begin.
+    Positions are absolute (distance from where the car entered the segment), like the abs() of the
+    reservation bounds. The occupied part of a car is the beginning of its reservation, so it is covered too.
+    A car holding the segment more than once (see Occupancy) has one span per reservation, numbered by slot
+    in the order of its reservations. """
+
+    def __init__(self) -> None:
+        self._begins: list[int] = []
+        self._ends: list[int] = []
+        self._cars: list = []
+        # car -> its spans, by slot
+        self._spans: dict = {}
+        # Lengths of all spans, sorted, so a query knows how far back to look
+        self._lengths: list[int] = []
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __contains__(self, car):
+        return car in self._spans
+
+    def span(self, car, slot: int = 0) -> tuple[int, int]:
+        spans = self._spans.get(car)
+        return spans[slot] if spans is not None and -len(spans) <= slot < len(spans) else None
+
+    def update(self, car, begin: int, end: int, slot: int = 0):
+        span = (begin, end) if begin <= end else (end, begin)
+        spans = self._spans.setdefault(car, [])
+        if slot < len(spans):
+            if spans[slot] == span:
+                return
+            self._delete(car, spans[slot])
+            spans[slot] = span
+        else:
+            spans.append(span)
+        self._insert(car, span)
+
+    def remove(self, car, slot: int = 0):
+        """ Drops one span of car, by default the one of its earliest reservation """
+        spans = self._spans.get(car)
+        if spans is None:
+            return
+        self._delete(car, spans.pop(slot))
+        if not spans:
+            del self._spans[car]
+
+    def state(self) -> tuple:
+        """ An immutable copy of the contents, for set_state """
+        return (tuple(self._begins), tuple(self._ends), tuple(self._cars),
+                tuple((car, tuple(spans)) for car, spans in self._spans.items()), tuple(self._lengths))
+
+    def set_state(self, state: tuple):
+        begins, ends, cars, spans, lengths = state
+        self._begins = list(begins)
+        self._ends = list(ends)
+        self._cars = list(cars)
+        self._spans = {car: list(car_spans) for car, car_spans in spans}
+        self._lengths = list(lengths)
+
+    def clear(self):
+        self._begins.clear()
+        self._ends.clear()
+        self._cars.clear()
+        self._spans.clear()
+        self._lengths.clear()
+
+    def overlapping(self, begin: int, end: int, exclude=None) -> list:
+        """ The cars with a span that shares at least one point with [begin, end] """
+        if begin > end:
+            begin, end = end, begin
+        first = bisect_left(self._begins, begin - (self._lengths[-1] if self._lengths else 0))
+        last = bisect_right(self._begins, end)
+        found = [self._cars[i] for i in range(first, last)
+                 if self._ends[i] >= begin and self._cars[i] is not exclude]
+        # A car with two spans in the window is reported once
+        return list(dict.fromkeys(found)) if len(found) > 1 else found
+
+    def _insert(self, car, span: tuple[int, int]):
+        i = bisect_right(self._begins, span[0])
+        self._begins.insert(i, span[0])
+        self._ends.insert(i, span[1])
+        self._cars.insert(i, car)
+        insort(self._lengths, span[1] - span[0])
+
+    def _delete(self, car, span: tuple[int, int]):
+        i = bisect_left(self._begins, span[0])
+        while self._cars[i] is not car or self._ends[i] != span[1]:
+            i += 1
+        del self._begins[i]
+        del self._ends[i]
+        del self._cars[i]
+        del self._lengths[bisect_left(self._lengths, span[1] - span[0])]
@@ -0,0 +1,51 @@
+import random
+
+from game_model.constants import *
+from game_model.road_network import Road
+
+
+def default_roads() -> list[Road]:
+    road_bottom = Road("bottom", True, 0, 1, 0)
+    road_right = Road("right", False, WINDOW_WIDTH - BLOCK_SIZE, 0, 1)
+    road_top = Road("top", True, WINDOW_HEIGHT - BLOCK_SIZE, 0, 1)
+    road_left = Road("left", False, 0, 1, 0)
+
+    road_h1 = Road("h1", True, 145, 0, 2)
+    road_h2 = Road("h2", True, 330, 3, 3)
+    road_h3 = Road("h3", True, 675, 2, 0)
+    road_v1 = Road("v1", False, 320, 0, 2)
+    road_v2 = Road("v2", False, 680, 3, 3)
+    road_v3 = Road("v3", False, 1200, 2, 0)
+
+    return [road_top, road_bottom, road_left, road_right, road_h1, road_h2, road_h3, road_v1, road_v2, road_v3]
+
+
+def grid_roads(rows: int,
+               cols: int,
+               right: int | tuple[int, int] = 1,
+               left: int | tuple[int, int] = 1,
+               gap: int | tuple[int, int] = 3 * BLOCK_SIZE,
+               seed: int = None) -> list[Road]:
+    """ rows horizontal and cols vertical roads crossing each other, starting at 0 and not bound to the window.
+    right and left are the lanes per direction of every road and gap the free space between neighbouring roads.
+    Each of them can be a (low, high) range instead, then every road draws its own value from the seeded generator. """
+    if (gap[0] if isinstance(gap, tuple) else gap) < 1:
+        # Without space between the roads the crossings touch and there are no lane segments to drive on
+        raise ValueError(f"gap must be at least 1, got {gap}")
+    rng = random.Random(seed)
+
+    def draw(value):
+        return rng.randint(*value) if isinstance(value, tuple) else value
+
+    roads = []
+    for horizontal, count, prefix in ((True, rows, "h"), (False, cols, "v")):
+        top = 0
+        for i in range(count):
+            right_lanes = draw(right)
+            left_lanes = draw(left)
+            if right_lanes + left_lanes == 0:
+                right_lanes = 1
+            road = Road(f"{prefix}{i}", horizontal, top, right_lanes, left_lanes)
+            roads.append(road)
+            top = road.bottom + draw(gap)
+    return roads
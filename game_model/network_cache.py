@@ -0,0 +1,67 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from game_model.compiled_network import CompiledNetwork
+from game_model.constants import *
+from game_model.helper_functions import create_segments
+from game_model.road_network import Road
+
+# Bump when the arrays of CompiledNetwork change meaning, so old caches are not picked up
+FORMAT_VERSION = 1
+
+
+def road_key(roads: list[Road]) -> str:
+    """ Hash of everything the compiled network depends on """
+    definition = [FORMAT_VERSION, BLOCK_SIZE, LANE_DISPLACEMENT]
+    for road in sorted(roads, key=lambda r: r.top):
+        definition.append((road.name, road.horizontal, road.top, len(road.right_lanes), len(road.left_lanes)))
+    return hashlib.sha1(repr(definition).encode()).hexdigest()
+
+
+def save_arrays(arrays: dict[str, np.ndarray], directory: str):
+    """ One .npy file per array, written to a temporary directory first so readers never see half of them """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), array)
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        # Another process stored the same arrays in the meantime
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+        os.rmdir(tmp)
+
+
+def load_arrays(names: tuple[str, ...], directory: str) -> dict[str, np.ndarray]:
+    """ The arrays stored in directory, memory-mapped, or None if there are none """
+    if not os.path.isdir(directory):
+        return None
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def save_network(network: CompiledNetwork, directory: str):
+    save_arrays({name: getattr(network, name) for name in CompiledNetwork.arrays}, directory)
+
+
+def load_network(roads: list[Road], directory: str) -> CompiledNetwork:
+    """ The network stored in directory, memory-mapped, or None if there is none """
+    arrays = load_arrays(CompiledNetwork.arrays, directory)
+    if arrays is None:
+        return None
+    roads.sort(key=lambda r: r.top)
+    return CompiledNetwork.from_arrays(roads, arrays)
+
+
+def cached_network(roads: list[Road], cache_dir: str) -> CompiledNetwork:
+    """ The compiled network of roads, from cache_dir if it was compiled before, else compiled and stored there """
+    directory = os.path.join(cache_dir, road_key(roads))
+    network = load_network(roads, directory)
+    if network is None:
+        network = CompiledNetwork(roads, create_segments(roads))
+        save_network(network, directory)
+    return network
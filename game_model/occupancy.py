@@ -0,0 +1,87 @@
+class Occupancy:
+    """ The cars on a segment in order of arrival, used like the list it replaces.
+    Membership is O(1). append, remove and index (the rank, i.e. how many entries arrived earlier)
+    are O(log n) through a Fenwick tree over arrival tickets.
+    Like in a list, a car turning through a block of crossings can be on a segment more than once,
+    remove and index then refer to its earliest entry. """
+
+    def __init__(self) -> None:
+        # car -> its tickets, oldest first
+        self._tickets: dict = {}
+        self._count = 0
+        self._next_ticket = 0
+        self._tree = [0] * 17
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, car):
+        return car in self._tickets
+
+    def __iter__(self):
+        return iter(sorted(self._tickets, key=lambda car: self._tickets[car][0]))
+
+    def append(self, car):
+        if self._next_ticket == len(self._tree) - 1:
+            self._compact()
+        self._tickets.setdefault(car, []).append(self._next_ticket)
+        self._add(self._next_ticket, 1)
+        self._next_ticket += 1
+        self._count += 1
+
+    def remove(self, car):
+        tickets = self._tickets.get(car)
+        if tickets is None:
+            raise ValueError(f"{car} is not on the segment")
+        self._add(tickets.pop(0), -1)
+        if not tickets:
+            del self._tickets[car]
+        self._count -= 1
+
+    def count(self, car) -> int:
+        tickets = self._tickets.get(car)
+        return len(tickets) if tickets is not None else 0
+
+    def index(self, car) -> int:
+        tickets = self._tickets.get(car)
+        if tickets is None:
+            raise ValueError(f"{car} is not on the segment")
+        # Number of entries still on the segment with an earlier ticket
+        rank = 0
+        i = tickets[0]
+        while i > 0:
+            rank += self._tree[i]
+            i -= i & -i
+        return rank
+
+    def state(self) -> tuple:
+        """ An immutable copy of the contents, for set_state """
+        return (tuple((car, tuple(tickets)) for car, tickets in self._tickets.items()),
+                tuple(self._tree), self._next_ticket, self._count)
+
+    def set_state(self, state: tuple):
+        tickets, tree, self._next_ticket, self._count = state
+        self._tickets = {car: list(car_tickets) for car, car_tickets in tickets}
+        self._tree = list(tree)
+
+    def clear(self):
+        self._tickets.clear()
+        self._count = 0
+        self._next_ticket = 0
+        self._tree = [0] * 17
+
+    def _add(self, ticket, value):
+        i = ticket + 1
+        while i < len(self._tree):
+            self._tree[i] += value
+            i += i & -i
+
+    def _compact(self):
+        # Out of tickets: hand out new ones in arrival order, with room for as many arrivals again
+        entries = sorted((ticket, car) for car, tickets in self._tickets.items() for ticket in tickets)
+        self._tree = [0] * (max(16, 2 * len(entries)) + 1)
+        self._tickets = {}
+        for new_ticket, (_, car) in enumerate(entries):
+            self._tickets.setdefault(car, []).append(new_ticket)
+            self._add(new_ticket, 1)
+        self._next_ticket = len(entries)
@@ -0,0 +1,82 @@
+import heapq
+
+import numpy as np
+
+from game_model.compiled_network import CompiledNetwork, CROSSING_SEGMENT, road_lanes
+from game_model.constants import *
+
+
+def reservation_reach(max_speed: int = BLOCK_SIZE // 2, max_size: int = 3 * BLOCK_SIZE // 2) -> int:
+    """ How far past the end of its first segment a car can reserve within one tick: it moves by its speed,
+    then Car.extend_res reserves its braking distance. The defaults are the limits of create_random_car. """
+    return max_speed + max_size + (max_speed * (max_speed + 1)) // 2 + BLOCK_SIZE // 2
+
+
+class TilePartition:
+    """ The segments of a compiled network split into a tiles_x * tiles_y grid of rectangular tiles.
+    All lanes of a road between two crossings land in the same tile, so lane changes never leave a tile.
+    The halo of a tile holds the foreign segments that a car of the tile can reserve within one tick,
+    its region is the tile plus its halo. Segments in the region of more than one tile are shared:
+    the cars on them are the boundary state that the tiles exchange every tick. """
+
+    def __init__(self, network: CompiledNetwork, tiles_x: int, tiles_y: int, reach: int = None) -> None:
+        self.tiles_x = tiles_x
+        self.tiles_y = tiles_y
+        self.tiles = tiles_x * tiles_y
+        self.reach = reservation_reach() if reach is None else reach
+
+        # Lane segments are placed by their middle along the road and by the road across it,
+        # crossings by the two roads that cross
+        tops = np.array([lane.road.top for lane in road_lanes(network.roads)], dtype=np.int64)
+        horizontal = np.array([lane.road.horizontal for lane in road_lanes(network.roads)], dtype=np.bool_)
+        crossing = network.kind == CROSSING_SEGMENT
+        lane_horizontal = horizontal[network.lane]
+        x = np.where(lane_horizontal, network.x + network.width // 2, tops[network.lane])
+        y = np.where(lane_horizontal, tops[network.lane], network.y + network.height // 2)
+        x = np.where(crossing, tops[np.maximum(network.cross_lane, 0)], x)
+        y = np.where(crossing, tops[network.lane], y)
+        column = np.minimum(x * tiles_x // max(network.world_width, 1), tiles_x - 1)
+        row = np.minimum(y * tiles_y // max(network.world_height, 1), tiles_y - 1)
+        # Owning tile of every segment
+        self.tile = (row * tiles_x + column).astype(np.int32)
+
+        self.halos = [self._halo(network, tile) for tile in range(self.tiles)]
+        self.regions = []
+        count = np.zeros(len(network), dtype=np.int32)
+        for tile, halo in enumerate(self.halos):
+            region = self.tile == tile
+            region[halo] = True
+            self.regions.append(region)
+            count += region
+        self.shared = count > 1
+
+    def _halo(self, network: CompiledNetwork, tile: int) -> np.ndarray:
+        # Shortest distance from the tile to the start of every foreign segment, up to reach
+        indptr, indices, length = network.indptr.tolist(), network.indices.tolist(), network.length.tolist()
+        owner = self.tile.tolist()
+        distance = {}
+        queue = []
+        for i in np.flatnonzero(self.tile == tile).tolist():
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                if owner[j] != tile and distance.get(j, self.reach) > 0:
+                    distance[j] = 0
+                    queue.append((0, j))
+        heapq.heapify(queue)
+        while queue:
+            d, i = heapq.heappop(queue)
+            if d > distance[i]:
+                continue
+            d += length[i]
+            if d >= self.reach:
+                continue
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                if owner[j] != tile and d < distance.get(j, self.reach):
+                    distance[j] = d
+                    heapq.heappush(queue, (d, j))
+        return np.array(sorted(distance), dtype=np.int64)
+
+    def sizes(self) -> list[tuple[int, int]]:
+        """ (owned segments, halo segments) of every tile """
+        return [(int((self.tile == tile).sum()), len(halo)) for tile, halo in enumerate(self.halos)]
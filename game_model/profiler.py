@@ -0,0 +1,46 @@
+from collections import deque
+
+import numpy as np
+
+
+class TickProfiler:
+    """ Wall time and call counts per phase of a tick.
+    Call sites check `enabled` before reading the clock, so a disabled profiler costs one attribute lookup.
+    Phases can be nested (move is part of dispatch, extend_res part of move), each one is timed on its own.
+    Counts and totals are exact, percentiles are taken over the last max_samples durations of a phase. """
+
+    def __init__(self, enabled: bool = False, max_samples: int = 100_000) -> None:
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self):
+        self._calls: dict[str, int] = {}
+        self._totals: dict[str, float] = {}
+        self._samples: dict[str, deque] = {}
+
+    def add(self, phase: str, seconds: float):
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = deque(maxlen=self.max_samples)
+            self._calls[phase] = 0
+            self._totals[phase] = 0.0
+        samples.append(seconds)
+        self._calls[phase] += 1
+        self._totals[phase] += seconds
+
+    def stats(self, reset: bool = False) -> dict[str, dict[str, float]]:
+        """ Per phase: calls, total, mean, p50, p90, p99 and max, all times in seconds """
+        stats = {}
+        for phase, samples in self._samples.items():
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            stats[phase] = {"calls": self._calls[phase],
+                            "total": self._totals[phase],
+                            "mean": self._totals[phase] / self._calls[phase],
+                            "p50": float(p50),
+                            "p90": float(p90),
+                            "p99": float(p99),
+                            "max": max(samples)}
+        if reset:
+            self.reset()
+        return stats
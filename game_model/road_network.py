@@ -1,10 +1,14 @@
 from dataclasses import dataclass
 from enum import Enum
-from pygame import Color
 from game_model.constants import *
+from game_model.interval_index import IntervalIndex
+from game_model.occupancy import Occupancy
 from abc import ABC
 
 
+Color = tuple[int, int, int]
+
+
 @dataclass
 class Point:
     x: int
@@ -96,8 +100,12 @@ class Lane:
 
 class Segment(ABC):
     def __init__(self) -> None:
+        self.id = None
         self.length = 0
-        self.cars = []
+        # The cars reserving this segment in order of arrival, which is their priority
+        self.cars = Occupancy()
+        # Reserved ranges of the cars in self.cars, for overlap queries
+        self.intervals = IntervalIndex()
         self.max_speed = 0
 
 
@@ -141,6 +149,17 @@ class CrossingSegment(Segment):
                f"{self.vert_lane.road.name}:{self.vert_lane.direction.name}:{self.vert_lane.num})"
 
 
+@dataclass(slots=True)
+class Reservation:
+    # The part [begin, end] of seg claimed by a car driving in direction dir.
+    # Negative positions for directions going against the axis (true_direction False)
+    seg: Segment
+    dir: Direction
+    turn: bool
+    begin: int
+    end: int
+
+
 class Goal:
     def __init__(self, lane_segment: LaneSegment, color: Color) -> None:
         self.lane_segment = lane_segment
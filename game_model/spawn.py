@@ -0,0 +1,52 @@
+import random
+
+from game_model.road_network import Road, LaneSegment, Segment, Color
+from gui.colors import colors
+
+
+class SpawnAllocator:
+    """ Precomputed sampling tables for spawning cars and placing goals.
+    Free lane segments and unused names are kept in pools that hand out a random entry
+    by swapping it with the last one, so every spawn and goal placement is O(1). """
+
+    def __init__(self, roads: list[Road], segments: list[Segment]) -> None:
+        self.lane_segments = [seg for seg in segments if isinstance(seg, LaneSegment)]
+        # road -> lane -> lane segments, only lanes with at least one lane segment
+        self.goal_table: list[list[list[LaneSegment]]] = []
+        for road in roads:
+            lanes = [[seg for seg in lane.segments if isinstance(seg, LaneSegment)]
+                     for lane in road.right_lanes + road.left_lanes]
+            lanes = [lane for lane in lanes if len(lane) > 0]
+            if len(lanes) > 0:
+                self.goal_table.append(lanes)
+        self.palette = list(colors.keys())
+        self.reset()
+
+    def reset(self):
+        self._free_segments = self.lane_segments.copy()
+        self._free_names = self.palette.copy()
+        # Number of times the palette was used up, names of later rounds get it as suffix
+        self._round = 0
+
+    def take_segment(self) -> LaneSegment:
+        """ A random lane segment no other car was spawned on """
+        if len(self._free_segments) == 0:
+            raise ValueError(f"All {len(self.lane_segments)} lane segments are taken, the map is too small")
+        return self._take(self._free_segments)
+
+    def take_name(self) -> tuple[str, Color]:
+        if len(self._free_names) == 0:
+            self._round += 1
+            self._free_names = self.palette.copy()
+        name = self._take(self._free_names)
+        return (name if self._round == 0 else f"{name}_{self._round}"), colors[name]
+
+    def goal_segment(self) -> LaneSegment:
+        # Same distribution as choosing a road, then a lane, then a lane segment
+        return random.choice(random.choice(random.choice(self.goal_table)))
+
+    @staticmethod
+    def _take(pool: list):
+        i = random.randrange(len(pool))
+        pool[i], pool[-1] = pool[-1], pool[i]
+        return pool.pop()
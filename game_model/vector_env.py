@@ -0,0 +1,70 @@
+import numpy as np
+
+from game_model.compiled_network import CompiledNetwork
+from game_model.game_model import TrafficEnv
+from game_model.road_network import Road, clock_wise
+
+# Columns of the observation of one car
+OBSERVATION = ("segment", "loc", "speed", "max_speed", "direction", "dead", "goal_dx", "goal_dy")
+
+
+def copy_roads(roads: list[Road]) -> list[Road]:
+    # Lanes keep a list of their segments, so every game needs roads of its own
+    return [Road(road.name, road.horizontal, road.top, len(road.right_lanes), len(road.left_lanes)) for road in roads]
+
+
+class VectorTrafficEnv:
+    """ K independent TrafficEnv instances stepped in lockstep, with NumPy arrays in and out.
+    The road network is compiled once, every instance builds its own segments over the same arrays.
+    An instance in which every car is done is reset within the step, the observation returned for it
+    is already the first one of the next episode. """
+
+    def __init__(self, roads: list[Road], players: int, num_envs: int, actions: tuple = (-1, 0, 1),
+                 cache_dir: str = None, **kwargs) -> None:
+        self.num_envs = num_envs
+        self.players = players
+        # Action i of the action array means the game action actions[i]
+        self.actions = np.array(actions, dtype=np.int64)
+        self.n_actions = len(actions)
+        template = TrafficEnv(roads, players, cache_dir=cache_dir, **kwargs)
+        arrays = {name: getattr(template.network, name) for name in CompiledNetwork.arrays}
+        self.envs = [template]
+        for _ in range(num_envs - 1):
+            env_roads = copy_roads(template.roads)
+            self.envs.append(TrafficEnv(env_roads, players, network=CompiledNetwork.from_arrays(env_roads, arrays),
+                                        **kwargs))
+        self._scores = np.zeros((num_envs, players), dtype=np.int64)
+        # Number of finished episodes per instance
+        self.episodes = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self) -> np.ndarray:
+        for env in self.envs:
+            env.reset()
+        self._scores[:] = 0
+        return self.observe()
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ actions is a (num_envs, players) array of indices into self.actions.
+        Returns the observations, the rewards (goals reached in this step) and the done flags of every car. """
+        codes = self.actions[actions].tolist()
+        dones = np.zeros((self.num_envs, self.players), dtype=np.bool_)
+        scores = np.zeros((self.num_envs, self.players), dtype=np.int64)
+        for k, env in enumerate(self.envs):
+            game_over, scores[k] = env.step_all([None if car.dead else code for car, code in zip(env.cars, codes[k])])
+            dones[k] = game_over
+        rewards = scores - self._scores
+        self._scores = scores
+        for k in np.flatnonzero(dones.all(axis=1)).tolist():
+            self.envs[k].reset()
+            self._scores[k] = 0
+            self.episodes[k] += 1
+        return self.observe(), rewards, dones
+
+    def observe(self) -> np.ndarray:
+        """ (num_envs, players, len(OBSERVATION)) array, columns as in OBSERVATION """
+        rows = []
+        for env in self.envs:
+            for car, goal in zip(env.cars, env.goals):
+                rows.append((car.res[0].seg.id, car.loc, car.speed, car.max_speed, clock_wise.index(car.direction),
+                             car.dead, goal.pos.x - car.pos.x, goal.pos.y - car.pos.y))
+        return np.array(rows, dtype=np.int32).reshape(self.num_envs, self.players, len(OBSERVATION))
@@ -1,23 +1,32 @@
+import time
+
 import pyglet
 from pyglet import shapes
 
 from game_model.constants import *
 from game_model.road_network import Direction, Point, LaneSegment, horiz_direction, true_direction
 from gui.helpful_functions import draw_arrow, draw_dash_line
+from simulation.trajectory import ReplayGame
 
 
 class CarsWindow(pyglet.window.Window):
     def __init__(self, game, controllers, segmentation=False, manual=False):
         super().__init__()
-        self.set_size(WINDOW_WIDTH, WINDOW_HEIGHT)
-        self.set_minimum_size(WINDOW_WIDTH, WINDOW_HEIGHT)
+        # The window shows a viewport of the world, moved with the arrow keys
+        self.view_width = min(WINDOW_WIDTH, game.network.world_width)
+        self.view_height = min(WINDOW_HEIGHT, game.network.world_height)
+        self.camera = Point(0, 0)
+        self.set_size(self.view_width, self.view_height)
+        self.set_minimum_size(self.view_width, self.view_height)
         self.pos = Point(0, 0)
         self.pos.x, self.pos.y = self.get_location()
         self.set_location(self.pos.x - 300, self.pos.y - 200)
 
         self.game = game
         self.controllers = controllers
-        self.segmentation = segmentation
+        # A ReplayGame shows a recorded run, it has no reservations to draw
+        self.replay = isinstance(game, ReplayGame)
+        self.segmentation = segmentation and not self.replay
         self.frames_count = 0
         self.manual = manual
 
@@ -29,10 +38,7 @@ class CarsWindow(pyglet.window.Window):
         self.goal_shapes = []
         self.car_shapes = []
 
-        for road in self.game.roads:
-            self._draw_road(road)
-        for road in self.game.roads:
-            self._draw_lane_lines(road)
+        self._draw_roads()
 
         self.event_loop = pyglet.app.EventLoop()
         pyglet.app.run(1 / FRAME_RATE)
@@ -44,7 +50,7 @@ class CarsWindow(pyglet.window.Window):
             self.frames_count = 0
         self._update_cars()
         self._update_goals()
-        background = shapes.Rectangle(x=0, y=0, width=WINDOW_WIDTH, height=WINDOW_HEIGHT, color=PALE_GREEN)
+        background = shapes.Rectangle(x=0, y=0, width=self.view_width, height=self.view_height, color=PALE_GREEN)
         background.draw()
         for shape in self.road_shapes:
             shape.draw()
@@ -56,10 +62,20 @@ class CarsWindow(pyglet.window.Window):
             self.frames_count += FRAME_RATE
 
     def _update_game(self):
+        if self.replay:
+            self.game.advance()
+            return
+        actions = []
         for player in range(self.game.players):
-            if not self.game_over[player]:
-                self.game_over[player], self.scores[player] = self.game.play_step(player,
-                                                                                  self.controllers[player].get_action())
+            if self.game_over[player]:
+                actions.append(None)
+            elif self.game.profiler.enabled:
+                start = time.perf_counter()
+                actions.append(self.controllers[player].get_action())
+                self.game.profiler.add("decision", time.perf_counter() - start)
+            else:
+                actions.append(self.controllers[player].get_action())
+        self.game_over, self.scores = self.game.step_all(actions)
         if all(self.game_over):
             print(f"Game Over:")
             for player in range(self.game.players):
@@ -70,120 +86,168 @@ class CarsWindow(pyglet.window.Window):
     def on_key_press(self, symbol, modifiers):
         if symbol == pyglet.window.key.SPACE:
             self.pause = not self.pause
+        elif symbol == pyglet.window.key.LEFT:
+            self._move_camera(-self.view_width // 4, 0)
+        elif symbol == pyglet.window.key.RIGHT:
+            self._move_camera(self.view_width // 4, 0)
+        elif symbol == pyglet.window.key.DOWN:
+            self._move_camera(0, -self.view_height // 4)
+        elif symbol == pyglet.window.key.UP:
+            self._move_camera(0, self.view_height // 4)
+        elif self.replay and symbol == pyglet.window.key.HOME:
+            self.game.seek(0)
+        elif self.replay and symbol == pyglet.window.key.END:
+            self.game.seek(self.game.trajectory.ticks - 1)
+        elif self.replay and symbol == pyglet.window.key.PAGEUP:
+            self.game.seek(self.game.tick + 100)
+        elif self.replay and symbol == pyglet.window.key.PAGEDOWN:
+            self.game.seek(self.game.tick - 100)
+
+    def _move_camera(self, dx, dy):
+        self.camera.x = max(0, min(self.camera.x + dx, self.game.network.world_width - self.view_width))
+        self.camera.y = max(0, min(self.camera.y + dy, self.game.network.world_height - self.view_height))
+        self._draw_roads()
+
+    def _visible(self, x, y, width, height) -> bool:
+        # Whether the world rectangle intersects the viewport
+        return x < self.camera.x + self.view_width and x + width > self.camera.x and \
+            y < self.camera.y + self.view_height and y + height > self.camera.y
 
     def _update_cars(self):
         self.car_shapes = []
         for player, car in enumerate(self.game.cars):
             if self.segmentation:
                 for segment in car.get_size_segments():
-                    if isinstance(segment["seg"], LaneSegment):
-                        begin_x = segment["seg"].begin + segment["begin"] if segment["seg"].lane.road.horizontal \
-                            else segment["seg"].lane.top
-                        begin_y = segment["seg"].lane.top if segment["seg"].lane.road.horizontal \
-                            else segment["seg"].begin + segment["begin"]
-                        end_x = segment["seg"].begin + segment["end"] if segment["seg"].lane.road.horizontal \
-                            else segment["seg"].lane.top + BLOCK_SIZE
-                        end_y = segment["seg"].lane.top + BLOCK_SIZE if segment["seg"].lane.road.horizontal \
-                            else segment["seg"].begin + segment["end"]
+                    if isinstance(segment.seg, LaneSegment):
+                        begin_x = segment.seg.begin + segment.begin if segment.seg.lane.road.horizontal \
+                            else segment.seg.lane.top
+                        begin_y = segment.seg.lane.top if segment.seg.lane.road.horizontal \
+                            else segment.seg.begin + segment.begin
+                        end_x = segment.seg.begin + segment.end if segment.seg.lane.road.horizontal \
+                            else segment.seg.lane.top + BLOCK_SIZE
+                        end_y = segment.seg.lane.top + BLOCK_SIZE if segment.seg.lane.road.horizontal \
+                            else segment.seg.begin + segment.end
                     else:
-                        if true_direction[segment["dir"]]:
-                            begin_x = segment["seg"].vert_lane.top + segment["begin"] if horiz_direction[segment["dir"]] \
-                                else segment["seg"].vert_lane.top
-                            begin_y = segment["seg"].horiz_lane.top if horiz_direction[segment["dir"]] \
-                                else segment["seg"].horiz_lane.top + segment["begin"]
-                            end_x = segment["seg"].vert_lane.top + segment["end"] if horiz_direction[segment["dir"]] \
-                                else segment["seg"].vert_lane.top + BLOCK_SIZE
-                            end_y = segment["seg"].horiz_lane.top + BLOCK_SIZE if horiz_direction[segment["dir"]] \
-                                else segment["seg"].horiz_lane.top + segment["end"]
+                        if true_direction[segment.dir]:
+                            begin_x = segment.seg.vert_lane.top + segment.begin if horiz_direction[segment.dir] \
+                                else segment.seg.vert_lane.top
+                            begin_y = segment.seg.horiz_lane.top if horiz_direction[segment.dir] \
+                                else segment.seg.horiz_lane.top + segment.begin
+                            end_x = segment.seg.vert_lane.top + segment.end if horiz_direction[segment.dir] \
+                                else segment.seg.vert_lane.top + BLOCK_SIZE
+                            end_y = segment.seg.horiz_lane.top + BLOCK_SIZE if horiz_direction[segment.dir] \
+                                else segment.seg.horiz_lane.top + segment.end
                         else:
-                            begin_x = segment["seg"].vert_lane.top + BLOCK_SIZE + segment["begin"] if horiz_direction[segment["dir"]] \
-                                else segment["seg"].vert_lane.top
-                            begin_y = segment["seg"].horiz_lane.top if horiz_direction[segment["dir"]] \
-                                else segment["seg"].horiz_lane.top + BLOCK_SIZE + segment["begin"]
-                            end_x = segment["seg"].vert_lane.top + BLOCK_SIZE + segment["end"] if horiz_direction[segment["dir"]] \
-                                else segment["seg"].vert_lane.top + BLOCK_SIZE
-                            end_y = segment["seg"].horiz_lane.top + BLOCK_SIZE if horiz_direction[segment["dir"]] \
-                                else segment["seg"].horiz_lane.top + BLOCK_SIZE + segment["end"]
-
-                    self.car_shapes.append(shapes.Rectangle(
-                        x=min(begin_x, end_x), y=min(begin_y, end_y),
-                        width=abs(end_x - begin_x), height=abs(end_y - begin_y),
-                        color=car.color if not car.dead else DEAD_GREY))
-            else:
+                            begin_x = segment.seg.vert_lane.top + BLOCK_SIZE + segment.begin if horiz_direction[segment.dir] \
+                                else segment.seg.vert_lane.top
+                            begin_y = segment.seg.horiz_lane.top if horiz_direction[segment.dir] \
+                                else segment.seg.horiz_lane.top + BLOCK_SIZE + segment.begin
+                            end_x = segment.seg.vert_lane.top + BLOCK_SIZE + segment.end if horiz_direction[segment.dir] \
+                                else segment.seg.vert_lane.top + BLOCK_SIZE
+                            end_y = segment.seg.horiz_lane.top + BLOCK_SIZE if horiz_direction[segment.dir] \
+                                else segment.seg.horiz_lane.top + BLOCK_SIZE + segment.end
+
+                    x, y = min(begin_x, end_x), min(begin_y, end_y)
+                    width, height = abs(end_x - begin_x), abs(end_y - begin_y)
+                    if self._visible(x, y, width, height):
+                        self.car_shapes.append(shapes.Rectangle(
+                            x=x - self.camera.x, y=y - self.camera.y,
+                            width=width, height=height,
+                            color=car.color if not car.dead else DEAD_GREY))
+            elif self._visible(car.pos.x - BLOCK_SIZE, car.pos.y - BLOCK_SIZE,
+                               car.w + 2 * BLOCK_SIZE, car.h + 2 * BLOCK_SIZE):
+                # Screen position, the margin above keeps the direction triangle of cars at the edge
+                pos = Point(car.pos.x - self.camera.x, car.pos.y - self.camera.y)
                 self.car_shapes.append(shapes.Rectangle(
-                    x=car.pos.x, y=car.pos.y,
+                    x=pos.x, y=pos.y,
                     width=car.w, height=car.h,
                     color=car.color if not car.dead else DEAD_GREY))
 
-                if car.res[0]["dir"] == Direction.RIGHT:
-                    self.car_shapes.append(shapes.Triangle(car.pos.x + car.w, car.pos.y,
-                                                           car.pos.x + car.w, car.pos.y + car.h,
-                                                           car.pos.x + car.w + car.h // 6,
-                                                           car.pos.y + car.h // 2,
+                if car.res[0].dir == Direction.RIGHT:
+                    self.car_shapes.append(shapes.Triangle(pos.x + car.w, pos.y,
+                                                           pos.x + car.w, pos.y + car.h,
+                                                           pos.x + car.w + car.h // 6,
+                                                           pos.y + car.h // 2,
                                                            car.color if not car.dead else DEAD_GREY))
-                elif car.res[0]["dir"] == Direction.LEFT:
-                    self.car_shapes.append(shapes.Triangle(car.pos.x, car.pos.y,
-                                                           car.pos.x, car.pos.y + car.h,
-                                                           car.pos.x - car.h // 6,
-                                                           car.pos.y + car.h // 2,
+                elif car.res[0].dir == Direction.LEFT:
+                    self.car_shapes.append(shapes.Triangle(pos.x, pos.y,
+                                                           pos.x, pos.y + car.h,
+                                                           pos.x - car.h // 6,
+                                                           pos.y + car.h // 2,
                                                            car.color if not car.dead else DEAD_GREY))
-                if car.res[0]["dir"] == Direction.UP:
-                    self.car_shapes.append(shapes.Triangle(car.pos.x, car.pos.y + car.h,
-                                                           car.pos.x + car.w, car.pos.y + car.h,
-                                                           car.pos.x + car.w // 2,
-                                                           car.pos.y + car.h + car.w // 6,
+                if car.res[0].dir == Direction.UP:
+                    self.car_shapes.append(shapes.Triangle(pos.x, pos.y + car.h,
+                                                           pos.x + car.w, pos.y + car.h,
+                                                           pos.x + car.w // 2,
+                                                           pos.y + car.h + car.w // 6,
                                                            car.color if not car.dead else DEAD_GREY))
-                if car.res[0]["dir"] == Direction.DOWN:
-                    self.car_shapes.append(shapes.Triangle(car.pos.x, car.pos.y,
-                                                           car.pos.x + car.w, car.pos.y,
-                                                           car.pos.x + car.w // 2,
-                                                           car.pos.y - car.w // 6,
+                if car.res[0].dir == Direction.DOWN:
+                    self.car_shapes.append(shapes.Triangle(pos.x, pos.y,
+                                                           pos.x + car.w, pos.y,
+                                                           pos.x + car.w // 2,
+                                                           pos.y - car.w // 6,
                                                            car.color if not car.dead else DEAD_GREY))
 
     def _update_goals(self):
         self.goal_shapes = []
         for goal in self.game.goals:
-            self.goal_shapes.append(shapes.Circle(goal.pos.x, goal.pos.y, BLOCK_SIZE // 2, color=goal.color))
-            self.goal_shapes.append(shapes.Circle(goal.pos.x, goal.pos.y, BLOCK_SIZE // 3, color=ROAD_BLUE))
-            self.goal_shapes.append(shapes.Circle(goal.pos.x, goal.pos.y, BLOCK_SIZE // 4, color=goal.color))
+            if not self._visible(goal.pos.x - BLOCK_SIZE // 2, goal.pos.y - BLOCK_SIZE // 2, BLOCK_SIZE, BLOCK_SIZE):
+                continue
+            x, y = goal.pos.x - self.camera.x, goal.pos.y - self.camera.y
+            self.goal_shapes.append(shapes.Circle(x, y, BLOCK_SIZE // 2, color=goal.color))
+            self.goal_shapes.append(shapes.Circle(x, y, BLOCK_SIZE // 3, color=ROAD_BLUE))
+            self.goal_shapes.append(shapes.Circle(x, y, BLOCK_SIZE // 4, color=goal.color))
+
+    def _draw_roads(self):
+        # Only the roads crossing the viewport, in screen coordinates
+        self.road_shapes = []
+        visible_roads = [road for road in self.game.roads
+                         if (road.horizontal and self._visible(self.camera.x, road.top, 1, road.bottom - road.top)) or
+                         (not road.horizontal and self._visible(road.top, self.camera.y, road.bottom - road.top, 1))]
+        for road in visible_roads:
+            self._draw_road(road)
+        for road in visible_roads:
+            self._draw_lane_lines(road)
 
     def _draw_road(self, road):
         if road.horizontal:
-            self.road_shapes.append(shapes.Rectangle(0, road.top, WINDOW_WIDTH, road.bottom - road.top,
+            self.road_shapes.append(shapes.Rectangle(0, road.top - self.camera.y, self.view_width, road.bottom - road.top,
                                                      color=ROAD_BLUE
                                                      ))
         else:
-            self.road_shapes.append(shapes.Rectangle(road.top, 0, road.bottom - road.top, WINDOW_HEIGHT,
+            self.road_shapes.append(shapes.Rectangle(road.top - self.camera.x, 0, road.bottom - road.top, self.view_height,
                                                      color=ROAD_BLUE
                                                      ))
 
     def _draw_lane_lines(self, road):
         for i, lane in enumerate(road.right_lanes + road.left_lanes):
+            # Screen position of the lane
+            top = lane.top - (self.camera.y if road.horizontal else self.camera.x)
             if road.horizontal:
                 if i == len(road.right_lanes) - 1 and len(road.left_lanes) > 0:
-                    self.road_shapes.append(shapes.Line(0, lane.top + BLOCK_SIZE,
-                                                        WINDOW_WIDTH, lane.top + BLOCK_SIZE,
+                    self.road_shapes.append(shapes.Line(0, top + BLOCK_SIZE,
+                                                        self.view_width, top + BLOCK_SIZE,
                                                         LANE_DISPLACEMENT, color=WHITE))
                 elif i < len(road.right_lanes + road.left_lanes) - 1:
-                    dashed_lines = draw_dash_line(Point(0, lane.top + BLOCK_SIZE),
-                                                  Point(WINDOW_WIDTH, lane.top + BLOCK_SIZE))
+                    dashed_lines = draw_dash_line(Point(0, top + BLOCK_SIZE),
+                                                  Point(self.view_width, top + BLOCK_SIZE))
                     for line in dashed_lines:
                         self.road_shapes.append(line)
-                arrow = draw_arrow(Point(1.5 * BLOCK_SIZE, lane.top + BLOCK_SIZE // 2),
-                                   Point(3 * BLOCK_SIZE, lane.top + BLOCK_SIZE // 2), True, lane.direction)
+                arrow = draw_arrow(Point(1.5 * BLOCK_SIZE, top + BLOCK_SIZE // 2),
+                                   Point(3 * BLOCK_SIZE, top + BLOCK_SIZE // 2), True, lane.direction)
                 for line in arrow:
                     self.road_shapes.append(line)
             else:
                 if i == len(road.right_lanes) - 1 and len(road.left_lanes) > 0:
-                    self.road_shapes.append(shapes.Line(lane.top + BLOCK_SIZE, 0,
-                                                        lane.top + BLOCK_SIZE, WINDOW_HEIGHT,
+                    self.road_shapes.append(shapes.Line(top + BLOCK_SIZE, 0,
+                                                        top + BLOCK_SIZE, self.view_height,
                                                         color=WHITE))
                 elif i < len(road.right_lanes + road.left_lanes) - 1:
-                    dashed_lines = draw_dash_line(Point(lane.top + BLOCK_SIZE, 0),
-                                                  Point(lane.top + BLOCK_SIZE, WINDOW_HEIGHT))
+                    dashed_lines = draw_dash_line(Point(top + BLOCK_SIZE, 0),
+                                                  Point(top + BLOCK_SIZE, self.view_height))
                     for line in dashed_lines:
                         self.road_shapes.append(line)
-                arrow = draw_arrow(Point(lane.top + BLOCK_SIZE // 2, 1.5 * BLOCK_SIZE),
-                                   Point(lane.top + BLOCK_SIZE // 2, 3 * BLOCK_SIZE), False, lane.direction)
+                arrow = draw_arrow(Point(top + BLOCK_SIZE // 2, 1.5 * BLOCK_SIZE),
+                                   Point(top + BLOCK_SIZE // 2, 3 * BLOCK_SIZE), False, lane.direction)
                 for line in arrow:
                     self.road_shapes.append(line)
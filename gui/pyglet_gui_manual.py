@@ -91,25 +91,25 @@ class CarsWindowManual(pyglet.window.Window):
                 x=car.pos.x, y=car.pos.y,
                 width=car.w, height=car.h,
                 color=car.color if not car.dead else DEAD_GREY))
-            if car.res[0]["dir"] == Direction.RIGHT:
+            if car.res[0].dir == Direction.RIGHT:
                 self.car_shapes.append(shapes.Triangle(car.pos.x + car.w, car.pos.y,
                                                        car.pos.x + car.w, car.pos.y + car.h,
                                                        car.pos.x + car.w + car.h // 6,
                                                        car.pos.y + car.h // 2,
                                                        car.color if not car.dead else DEAD_GREY))
-            elif car.res[0]["dir"] == Direction.LEFT:
+            elif car.res[0].dir == Direction.LEFT:
                 self.car_shapes.append(shapes.Triangle(car.pos.x, car.pos.y,
                                                        car.pos.x, car.pos.y + car.h,
                                                        car.pos.x - car.h // 6,
                                                        car.pos.y + car.h // 2,
                                                        car.color if not car.dead else DEAD_GREY))
-            if car.res[0]["dir"] == Direction.UP:
+            if car.res[0].dir == Direction.UP:
                 self.car_shapes.append(shapes.Triangle(car.pos.x, car.pos.y + car.h,
                                                        car.pos.x + car.w, car.pos.y + car.h,
                                                        car.pos.x + car.w // 2,
                                                        car.pos.y + car.h + car.w // 6,
                                                        car.color if not car.dead else DEAD_GREY))
-            if car.res[0]["dir"] == Direction.DOWN:
+            if car.res[0].dir == Direction.DOWN:
                 self.car_shapes.append(shapes.Triangle(car.pos.x, car.pos.y,
                                                        car.pos.x + car.w, car.pos.y,
                                                        car.pos.x + car.w // 2,
@@ -1,14 +1,21 @@
 from game_model.constants import *
 from controller.astar_car_controller import AstarCarController
+from controller.contraction import ContractionHierarchy, cached_hierarchy
 from game_model.game_model import TrafficEnv
+from game_model.maps import default_roads
 from game_model.road_network import Road
 from gui.pyglet_gui import CarsWindow
 
 
-def main(players, roads, segmentation):
+def main(players, roads, segmentation, cache_dir=None, hierarchy=False):
 
-    game = TrafficEnv(players=players, roads=roads)
-    controllers = [AstarCarController(game=game, player=i) for i in range(players)]
+    game = TrafficEnv(players=players, roads=roads, cache_dir=cache_dir)
+    router = None
+    if hierarchy:
+        # Built on the first launch, afterwards loaded from the cache
+        router = cached_hierarchy(game.network, cache_dir) if cache_dir is not None \
+            else ContractionHierarchy.build(game.network)
+    controllers = [AstarCarController(game=game, player=i, router=router) for i in range(players)]
 
     CarsWindow(game, controllers, segmentation=segmentation)
 
@@ -18,24 +25,18 @@ if __name__ == '__main__':
 
     players = 50
     segmentation = False
-
-    road_bottom = Road("bottom", True, 0, 1, 0)
-    road_right = Road("right", False, WINDOW_WIDTH - BLOCK_SIZE, 0, 1)
-    road_top = Road("top", True, WINDOW_HEIGHT - BLOCK_SIZE, 0, 1)
-    road_left = Road("left", False, 0, 1, 0)
-
-    road_h1 = Road("h1", True, 145, 0, 2)
-    road_h2 = Road("h2", True, 330, 3, 3)
-    road_h3 = Road("h3", True, 675, 2, 0)
-    road_v1 = Road("v1", False, 320, 0, 2)
-    road_v2 = Road("v2", False, 680, 3, 3)
-    road_v3 = Road("v3", False, 1200, 2, 0)
+    # Compiled road networks are kept here between launches
+    cache_dir = ".network_cache"
+    # Route with a contraction hierarchy stored in cache_dir instead of next hop tables
+    hierarchy = False
 
     one_road = Road("r1", True, 400, 6, 0)
 
-    roads = [road_top, road_bottom, road_left, road_right, road_h1, road_h2, road_h3, road_v1, road_v2, road_v3]
-    # roads = [road_top, road_bottom, road_left, road_right, one_road]
+    roads = default_roads()
+    # roads = default_roads()[:4] + [one_road]
 
     main(players=players,
          roads=roads,
-         segmentation=segmentation)
+         segmentation=segmentation,
+         cache_dir=cache_dir,
+         hierarchy=hierarchy)
@@ -0,0 +1,15 @@
+import sys
+
+from gui.pyglet_gui import CarsWindow
+from simulation.trajectory import Trajectory, ReplayGame
+
+
+def replay(path, tick=0):
+    game = ReplayGame(Trajectory(path))
+    game.seek(tick)
+    CarsWindow(game, controllers=None)
+
+
+if __name__ == '__main__':
+    # python replay.py <recording directory> [tick]
+    replay(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 0)
@@ -0,0 +1,85 @@
+import random
+import time
+
+from controller.astar_car_controller import AstarCarController
+from game_model.game_model import TrafficEnv
+from game_model.maps import default_roads
+from simulation.trajectory import TrajectoryRecorder
+
+
+class HeadlessRunner:
+    """ Drives a TrafficEnv without a window: every call to step() is one tick for all cars """
+
+    def __init__(self, game: TrafficEnv, controllers: list, recorder: TrajectoryRecorder = None):
+        self.game = game
+        self.controllers = controllers
+        # Stores the state after every tick, if given
+        self.recorder = recorder
+        self.ticks = 0
+        self.episode_ticks = 0
+        # Final scores of every finished episode
+        self.episodes: list[list[int]] = []
+
+    def step(self) -> bool:
+        game_over, scores = self.game.step_all(self._decide())
+        if self.recorder is not None:
+            self.recorder.record()
+        self.ticks += 1
+        self.episode_ticks += 1
+        if all(game_over):
+            self._end_episode(scores)
+            return True
+        return False
+
+    def run(self, ticks: int) -> list[list[int]]:
+        for _ in range(ticks):
+            self.step()
+        return self.episodes
+
+    def run_episode(self, max_ticks: int = None) -> list[int]:
+        while max_ticks is None or self.episode_ticks < max_ticks:
+            if self.step():
+                return self.episodes[-1]
+        self._end_episode(self.game.scores.copy())
+        return self.episodes[-1]
+
+    def _decide(self) -> list:
+        profiler = self.game.profiler
+        actions = []
+        for controller, car in zip(self.controllers, self.game.cars):
+            if car.dead:
+                actions.append(None)
+            elif profiler.enabled:
+                start = time.perf_counter()
+                actions.append(controller.get_action())
+                profiler.add("decision", time.perf_counter() - start)
+            else:
+                actions.append(controller.get_action())
+        return actions
+
+    def _end_episode(self, scores):
+        self.episodes.append(scores)
+        self.episode_ticks = 0
+        self.game.reset()
+
+
+if __name__ == '__main__':
+    players = 50
+    ticks = 1000
+    random.seed(0)
+
+    game = TrafficEnv(players=players, roads=default_roads())
+    runner = HeadlessRunner(game, [AstarCarController(game=game, player=i) for i in range(players)])
+
+    start = time.perf_counter()
+    runner.run(ticks)
+    elapsed = time.perf_counter() - start
+    print(f"{ticks} ticks with {players} players in {elapsed:.2f}s ({ticks / elapsed:.1f} ticks/s)")
+    print(f"Scores: {game.scores}")
+
+    # Where the time of a tick goes
+    game.profiler.enabled = True
+    runner.run(100)
+    for phase, stats in game.stats().items():
+        print(f"{phase:>10}: {stats['calls']:>7} calls, {stats['total'] * 1e3:9.1f} ms, "
+              f"p50 {stats['p50'] * 1e6:8.1f} us, p99 {stats['p99'] * 1e6:8.1f} us")
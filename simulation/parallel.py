@@ -0,0 +1,126 @@
+""" Independent headless episodes spread over a process pool.
+
+    python -m simulation.parallel --episodes 32 --players 50 --workers 8 --output report.json
+
+Every worker builds its TrafficEnv once and resets it for each episode. Episode i is seeded with
+seed + i, so the results do not depend on the number of workers or on which worker ran an episode. """
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from controller.astar_car_controller import AstarCarController
+from game_model.event_log import EventType
+from game_model.game_model import TrafficEnv
+from game_model.maps import default_roads, grid_roads
+from game_model.road_network import Road
+from simulation.headless import HeadlessRunner
+from simulation.trajectory import road_definitions
+
+# The game of this worker process, set by _init_worker
+_game: TrafficEnv = None
+_max_ticks: int = None
+
+
+def _init_worker(roads: list[list], players: int, max_ticks: int, cache_dir: str):
+    global _game, _max_ticks
+    _game = TrafficEnv([Road(*definition) for definition in roads], players, cache_dir=cache_dir)
+    _max_ticks = max_ticks
+
+
+def _run_episode(seed: int) -> tuple[int, int, np.ndarray, np.ndarray, np.ndarray]:
+    """ (seed, ticks, scores, crashes, goals reached), the arrays have one entry per player """
+    game = _game
+    random.seed(seed)
+    game.reset()
+    game.events.drain()
+    runner = HeadlessRunner(game, [AstarCarController(game, player) for player in range(game.players)])
+    players = {car.name: player for player, car in enumerate(game.cars)}
+    crashes = np.zeros(game.players, dtype=np.int32)
+    goals = np.zeros(game.players, dtype=np.int32)
+    scores = None
+    while runner.episode_ticks < _max_ticks:
+        done = runner.step()
+        # Drained every tick, so a long episode cannot overflow the event buffer
+        for event in game.events.drain():
+            if event.type == EventType.CRASH:
+                # One event per crash, both cars crashed
+                crashes[players[event.car]] += 1
+                crashes[players[event.other]] += 1
+            elif event.type == EventType.GOAL_REACHED:
+                goals[players[event.car]] += 1
+        if done:
+            scores = runner.episodes[-1]
+            break
+    if scores is None:
+        scores = game.scores
+    return seed, runner.ticks, np.array(scores, dtype=np.int32), crashes, goals
+
+
+class EpisodeReport:
+    """ The results of all episodes of a run, one row per episode """
+
+    def __init__(self, results: list[tuple], elapsed: float) -> None:
+        self.elapsed = elapsed
+        self.seeds = np.array([result[0] for result in results], dtype=np.int64)
+        self.ticks = np.array([result[1] for result in results], dtype=np.int64)
+        self.scores = np.stack([result[2] for result in results])
+        self.crashes = np.stack([result[3] for result in results])
+        self.goals = np.stack([result[4] for result in results])
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def summary(self) -> dict:
+        return {"episodes": len(self),
+                "players": self.scores.shape[1],
+                "elapsed": self.elapsed,
+                "ticks": int(self.ticks.sum()),
+                "ticks_per_second": float(self.ticks.sum() / self.elapsed) if self.elapsed > 0 else None,
+                "mean_score": float(self.scores.mean()),
+                # Every crash is counted for both of its cars
+                "crashes": int(self.crashes.sum()) // 2,
+                "goals_reached": int(self.goals.sum())}
+
+    def to_dict(self) -> dict:
+        return {"summary": self.summary(),
+                "seeds": self.seeds.tolist(),
+                "ticks": self.ticks.tolist(),
+                "scores": self.scores.tolist(),
+                "crashes": self.crashes.tolist(),
+                "goals": self.goals.tolist()}
+
+
+def run_episodes(roads: list[Road], players: int, episodes: int, max_ticks: int = 1000, seed: int = 0,
+                 workers: int = None, cache_dir: str = None) -> EpisodeReport:
+    """ Runs episodes with seeds seed, seed + 1, ... on `workers` processes (default: one per CPU) """
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(road_definitions(roads), players, max_ticks, cache_dir)) as executor:
+        results = list(executor.map(_run_episode, range(seed, seed + episodes)))
+    return EpisodeReport(results, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--episodes", type=int, default=os.cpu_count())
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--max-ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--grid", type=int, help="a grid map of this many roads per side instead of the default map")
+    parser.add_argument("--cache-dir", help="network cache shared by the workers")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = run_episodes(grid_roads(args.grid, args.grid) if args.grid else default_roads(), args.players,
+                          args.episodes, args.max_ticks, args.seed, args.workers, args.cache_dir)
+    for key, value in report.summary().items():
+        print(f"{key:>16}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report.to_dict(), file)
@@ -0,0 +1,315 @@
+""" One game stepped by several processes, each owning one tile of the road network.
+
+    python -m simulation.tiled --grid 12 --players 400 --tiles 2 2 --ticks 500
+
+Every process keeps a full copy of the segments but only moves the cars whose first reserved segment
+lies in its tile. Once per tick, after moving, each process writes the state of its cars into a row per
+car in shared memory and marks the rows of cars that reserve a shared segment (see TilePartition).
+After a barrier every process copies the marked rows that touch its region into its own game as
+ghost cars, so collisions and the reservations seen by its controllers include the cars of its
+neighbours. A car whose first segment moved into another tile is taken over by that tile's process.
+
+Controllers give way by the order in which cars arrived on a segment. Within one process that order is
+the tick of the reservation, then the player, so every reservation carries its tick through the
+exchange and the segments that got ghosts are put back into that order.
+
+The halo of a tile covers everything Car.extend_res can reserve within a tick, so a braking
+reservation that crosses a tile border always lands on a shared segment and is exchanged before the
+collision check. Cars move exactly as in TrafficEnv.step_all, only the new goals are drawn from a
+random generator per process, so runs still differ from single-process runs with the same seed. """
+import argparse
+import random
+import time
+from multiprocessing import Barrier, Process, SimpleQueue
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from controller.astar_car_controller import AstarCarController
+from game_model.compiled_network import CompiledNetwork
+from game_model.event_log import EventType
+from game_model.game_model import TrafficEnv
+from game_model.helper_functions import collision_pairs, create_segments
+from game_model.maps import default_roads, grid_roads
+from game_model.network_cache import cached_network
+from game_model.partition import TilePartition
+from game_model.road_network import Road, Reservation, clock_wise
+from game_model.vector_env import copy_roads
+
+# Columns of a car row, followed by max_res reservations and max_res parallel reservations
+PUBLISHED, SPEED, LOC, DIRECTION, DEAD, LANE_CHANGE, CROSSING, GOAL, SCORE, USELESS, RES, PARALLEL = range(12)
+HEADER = 12
+# segment, direction, turn, begin, end, tick it was made in
+RESERVATION = 6
+
+
+def row_width(max_res: int) -> int:
+    return HEADER + 2 * RESERVATION * max_res
+
+
+def max_reservations(network: CompiledNetwork, reach: int) -> int:
+    # The first segment, then enough of the shortest segments to cover the reach
+    return 2 + -(-reach // int(network.length.min()))
+
+
+class TileWorker:
+    """ The part of a tiled run that one process does, on its own copy of the game """
+
+    def __init__(self, game: TrafficEnv, partition: TilePartition, tile: int, max_res: int) -> None:
+        self.game = game
+        self.partition = partition
+        self.tile = tile
+        self.max_res = max_res
+        self.owner = partition.tile.tolist()
+        self.region = partition.regions[tile]
+        self.shared = partition.shared
+        self.controllers = [AstarCarController(game, player) for player in range(game.players)]
+        self.players = {car: player for player, car in enumerate(game.cars)}
+        # (reservation, tick it was made in) for res + parallel_res of every car, the reset is tick 0
+        self.arrivals = [[(seg_info, 0) for seg_info in car.res + car.parallel_res] for car in game.cars]
+        # Players whose cars this worker moves, and players whose cars it only shows
+        self.owned = {player for player, car in enumerate(game.cars) if self.owner[car.res[0].seg.id] == tile}
+        # All copies start from the same reset, the first exchange removes the ghosts that are not needed
+        self.ghosts = set(range(game.players)) - self.owned
+        self.crashes = 0
+
+    def move(self):
+        """ Decides and moves the owned cars, like the first half of TrafficEnv.step_all """
+        game = self.game
+        game.events.tick += 1
+        actions = {player: self.controllers[player].get_action() for player in sorted(self.owned)
+                   if not game.cars[player].dead}
+        for player, action in actions.items():
+            game._act(player, action)
+            self._track(player)
+
+    def publish(self, rows: np.ndarray):
+        """ Writes the row of every owned car, and hands over the cars that left the tile """
+        shared = self.shared
+        for player in self.owned:
+            car = self.game.cars[player]
+            self._encode(player, rows[player])
+            rows[player, PUBLISHED] = any(shared[seg_info.seg.id] for seg_info in car.res + car.parallel_res) \
+                or self.owner[car.res[0].seg.id] != self.tile
+        leaving = {player for player in self.owned if self.owner[self.game.cars[player].res[0].seg.id] != self.tile}
+        self.owned -= leaving
+        self.ghosts |= leaving
+
+    def absorb(self, rows: np.ndarray):
+        """ Replaces the ghosts by the published rows that touch the region of the tile """
+        published = set(np.flatnonzero(rows[:, PUBLISHED]).tolist())
+        for player in self.ghosts - published:
+            self._detach(self.game.cars[player])
+        self.ghosts &= published
+        arrived = set()
+        for player in published - self.owned:
+            row = rows[player]
+            segments = [int(row[HEADER + RESERVATION * i]) for i in range(int(row[RES]))]
+            segments += [int(row[HEADER + RESERVATION * (self.max_res + i)]) for i in range(int(row[PARALLEL]))]
+            car = self.game.cars[player]
+            if player in self.ghosts:
+                self._detach(car)
+            if not self.region[segments].any():
+                self.ghosts.discard(player)
+                continue
+            self._decode(player, row)
+            self._attach(car)
+            arrived.update(seg_info.seg for seg_info in car.res + car.parallel_res)
+            if self.owner[segments[0]] == self.tile:
+                self.owned.add(player)
+                self.ghosts.discard(player)
+            else:
+                self.ghosts.add(player)
+        for segment in arrived:
+            self._order(segment)
+
+    def resolve(self):
+        """ Crashes and goals, like the second half of TrafficEnv.step_all """
+        game = self.game
+        players = sorted(self.owned | self.ghosts)
+        cars = [game.cars[player] for player in players]
+        for i, j in collision_pairs(cars):
+            if cars[i].dead and cars[j].dead:
+                continue
+            # One event per pair like in step_all, reported by the tile that owns the lower player
+            if players[i] in self.owned:
+                game.events.record(EventType.CRASH, cars[i], other=cars[j])
+                self.crashes += 1
+            cars[i].dead = cars[j].dead = True
+        for player in sorted(self.owned):
+            if not game.cars[player].dead:
+                game._check_goal(player)
+
+    def _encode(self, player: int, row: np.ndarray):
+        car = self.game.cars[player]
+        if len(car.res) > self.max_res or len(car.parallel_res) > self.max_res:
+            raise ValueError(f"car {car.name} holds more than {self.max_res} reservations")
+        row[SPEED], row[LOC], row[DIRECTION], row[DEAD] = \
+            car.speed, car.loc, clock_wise.index(car.direction), car.dead
+        row[LANE_CHANGE], row[CROSSING] = car.lane_change_counter, car.crossing_counter
+        row[GOAL] = self.game.goals[player].lane_segment.id
+        row[SCORE], row[USELESS] = self.game.scores[player], self.game.useless_iterations[player]
+        row[RES], row[PARALLEL] = len(car.res), len(car.parallel_res)
+        arrivals = self.arrivals[player]
+        for offset, first, count in ((HEADER, 0, len(car.res)),
+                                     (HEADER + RESERVATION * self.max_res, len(car.res), len(car.parallel_res))):
+            for i in range(count):
+                seg_info, tick = arrivals[first + i]
+                row[offset + RESERVATION * i:offset + RESERVATION * (i + 1)] = \
+                    (seg_info.seg.id, clock_wise.index(seg_info.dir), seg_info.turn, seg_info.begin, seg_info.end, tick)
+
+    def _decode(self, player: int, row: np.ndarray):
+        game = self.game
+        car = game.cars[player]
+        values = row.tolist()
+        car.speed, car.loc, car.direction, car.dead = \
+            values[SPEED], values[LOC], clock_wise[values[DIRECTION]], bool(values[DEAD])
+        car.lane_change_counter, car.crossing_counter = values[LANE_CHANGE], values[CROSSING]
+        game.scores[player], game.useless_iterations[player] = values[SCORE], values[USELESS]
+        goal = game.goals[player]
+        if goal.lane_segment.id != values[GOAL]:
+            goal.lane_segment = game.segments[values[GOAL]]
+            goal.update_position()
+
+        def reservations(offset, count):
+            return [(Reservation(game.segments[values[i]], clock_wise[values[i + 1]], bool(values[i + 2]),
+                                 values[i + 3], values[i + 4]), values[i + 5])
+                    for i in range(offset, offset + RESERVATION * count, RESERVATION)]
+
+        res = reservations(HEADER, values[RES])
+        parallel_res = reservations(HEADER + RESERVATION * self.max_res, values[PARALLEL])
+        car.res = [seg_info for seg_info, _ in res]
+        car.parallel_res = [seg_info for seg_info, _ in parallel_res]
+        self.arrivals[player] = res + parallel_res
+        car._update_position()
+
+    def _track(self, player: int):
+        # Reservations made in this tick are the ones not seen before
+        car = self.game.cars[player]
+        known = self.arrivals[player]
+        tick = self.game.events.tick
+        self.arrivals[player] = [(seg_info, next((arrival for old, arrival in known if old is seg_info), tick))
+                                 for seg_info in car.res + car.parallel_res]
+
+    def _order(self, segment):
+        # Back into the order in which a single process would have appended the cars
+        def arrival(car):
+            player = self.players[car]
+            return min(tick for seg_info, tick in self.arrivals[player] if seg_info.seg is segment), player
+
+        cars = [(car, segment.cars.count(car)) for car in segment.cars]
+        cars.sort(key=lambda entry: arrival(entry[0]))
+        segment.cars.clear()
+        for car, count in cars:
+            for _ in range(count):
+                segment.cars.append(car)
+
+    @staticmethod
+    def _attach(car):
+        for seg_info in car.res + car.parallel_res:
+            seg_info.seg.cars.append(car)
+        car._index_res()
+
+    @staticmethod
+    def _detach(car):
+        for seg_info in car.res + car.parallel_res:
+            seg_info.seg.cars.remove(car)
+            seg_info.seg.intervals.remove(car)
+
+
+class TiledReport:
+    def __init__(self, rows: np.ndarray, tiles: list[dict], ticks: int, elapsed: float) -> None:
+        self.scores = rows[:, SCORE].copy()
+        self.dead = rows[:, DEAD].astype(np.bool_)
+        # Per tile: owned cars at the end, mean ghosts per tick, crashes reported, seconds spent waiting
+        self.tiles = tiles
+        self.ticks = ticks
+        self.elapsed = elapsed
+
+    def summary(self) -> dict:
+        return {"players": len(self.scores),
+                "ticks": self.ticks,
+                "elapsed": self.elapsed,
+                "ticks_per_second": self.ticks / self.elapsed if self.elapsed > 0 else None,
+                "mean_score": float(self.scores.mean()),
+                "dead": int(self.dead.sum()),
+                "crashes": sum(tile["crashes"] for tile in self.tiles)}
+
+
+def _run_tile(roads: list[Road], players: int, partition: TilePartition, tile: int, seed: int, ticks: int,
+              max_res: int, memory: str, barrier, results: SimpleQueue, cache_dir: str):
+    # The same seed everywhere gives every process the same reset, the goals are then drawn per tile
+    random.seed(seed)
+    game = TrafficEnv(roads, players, cache_dir=cache_dir)
+    random.seed(f"{seed}/{tile}")
+    worker = TileWorker(game, partition, tile, max_res)
+    shm = SharedMemory(name=memory)
+    buffers = np.ndarray((2, players, row_width(max_res)), dtype=np.int64, buffer=shm.buf)
+    ghosts = 0
+    waiting = 0.0
+    for tick in range(ticks):
+        worker.move()
+        # Double buffered: writing the next tick cannot overwrite rows another process is still reading
+        worker.publish(buffers[tick % 2])
+        start = time.perf_counter()
+        barrier.wait()
+        waiting += time.perf_counter() - start
+        worker.absorb(buffers[tick % 2])
+        worker.resolve()
+        ghosts += len(worker.ghosts)
+    # The final state of every owned car, for the report
+    worker.publish(buffers[ticks % 2])
+    results.put({"tile": tile, "owned": len(worker.owned), "ghosts": ghosts / max(ticks, 1),
+                 "crashes": worker.crashes, "waiting": waiting})
+    del buffers
+    shm.close()
+
+
+def run_tiled(roads: list[Road], players: int, tiles: tuple[int, int] = (2, 2), ticks: int = 1000, seed: int = 0,
+              cache_dir: str = None) -> TiledReport:
+    """ Steps one game for ticks ticks on tiles[0] * tiles[1] processes """
+    network = cached_network(roads, cache_dir) if cache_dir is not None \
+        else CompiledNetwork(roads, create_segments(roads))
+    partition = TilePartition(network, *tiles)
+    max_res = max_reservations(network, partition.reach)
+    shape = (2, players, row_width(max_res))
+    shm = SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.int64).itemsize)
+    try:
+        buffers = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+        buffers[:] = 0
+        barrier = Barrier(partition.tiles)
+        results = SimpleQueue()
+        start = time.perf_counter()
+        processes = [Process(target=_run_tile, args=(copy_roads(network.roads), players, partition, tile, seed,
+                                                     ticks, max_res, shm.name, barrier, results, cache_dir))
+                     for tile in range(partition.tiles)]
+        for process in processes:
+            process.start()
+        reports = sorted((results.get() for _ in processes), key=lambda report: report["tile"])
+        for process in processes:
+            process.join()
+        report = TiledReport(buffers[ticks % 2], reports, ticks, time.perf_counter() - start)
+        del buffers
+    finally:
+        shm.close()
+        shm.unlink()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--grid", type=int, help="a grid map of this many roads per side instead of the default map")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--tiles", type=int, nargs=2, default=(2, 2))
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir")
+    args = parser.parse_args()
+
+    tiled = run_tiled(grid_roads(args.grid, args.grid) if args.grid else default_roads(), args.players,
+                      tuple(args.tiles), args.ticks, args.seed, args.cache_dir)
+    for key, value in tiled.summary().items():
+        print(f"{key:>16}: {value}")
+    for tile in tiled.tiles:
+        print(f"tile {tile['tile']}: {tile['owned']} cars, {tile['ghosts']:.1f} ghosts per tick, "
+              f"{tile['crashes']} crashes, {tile['waiting']:.2f}s waiting")
@@ -0,0 +1,176 @@
+import bisect
+import json
+import os
+
+import numpy as np
+
+from game_model.car import car_geometry
+from game_model.compiled_network import CompiledNetwork
+from game_model.game_model import TrafficEnv
+from game_model.helper_functions import create_segments
+from game_model.network_cache import cached_network
+from game_model.road_network import Road, Goal, Reservation, Point, LaneSegment, clock_wise
+
+FORMAT_VERSION = 1
+
+# One file per column, one row of `players` values per tick
+COLUMNS = {"segment": np.int32,
+           "loc": np.int32,
+           "speed": np.int16,
+           # Index into clock_wise of the direction of res[0]
+           "direction": np.int8,
+           "lane_change": np.int8,
+           "dead": np.bool_,
+           "size": np.int16,
+           # Lane segment of the goal
+           "goal": np.int32}
+
+
+def road_definitions(roads: list[Road]) -> list[list]:
+    return [[road.name, road.horizontal, road.top, len(road.right_lanes), len(road.left_lanes)] for road in roads]
+
+
+class TrajectoryRecorder:
+    """ Appends the state of every car after each tick to a directory of column files.
+    Rows are buffered and written in chunks of chunk_ticks ticks. Names and colors only change
+    when the game is reset, they are kept per episode in episodes.json. """
+
+    def __init__(self, path: str, game: TrafficEnv, chunk_ticks: int = 1024) -> None:
+        self.path = path
+        self.game = game
+        self.players = game.players
+        self.ticks = 0
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "meta.json"), "w") as file:
+            json.dump({"version": FORMAT_VERSION,
+                       "players": self.players,
+                       "columns": {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+                       "roads": road_definitions(game.roads)}, file)
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in COLUMNS}
+        self._buffers = {name: np.zeros((chunk_ticks, self.players), dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._rows = 0
+        self._episodes = []
+        self._cars = None
+
+    def record(self):
+        """ Stores the current state of the game as the next tick """
+        cars = self.game.cars
+        if cars is not self._cars:
+            # reset replaces the list of cars
+            self._cars = cars
+            self._new_episode()
+        row = self._rows
+        buffers = self._buffers
+        buffers["segment"][row] = [car.res[0].seg.id for car in cars]
+        buffers["loc"][row] = [car.loc for car in cars]
+        buffers["speed"][row] = [car.speed for car in cars]
+        buffers["direction"][row] = [clock_wise.index(car.res[0].dir) for car in cars]
+        buffers["lane_change"][row] = [car.lane_change_counter for car in cars]
+        buffers["dead"][row] = [car.dead for car in cars]
+        buffers["size"][row] = [car.size for car in cars]
+        buffers["goal"][row] = [goal.lane_segment.id for goal in self.game.goals]
+        self._rows += 1
+        self.ticks += 1
+        if self._rows == len(buffers["segment"]):
+            self.flush()
+
+    def flush(self):
+        for name, file in self._files.items():
+            self._buffers[name][:self._rows].tofile(file)
+            file.flush()
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+        for file in self._files.values():
+            file.close()
+
+    def _new_episode(self):
+        self._episodes.append({"tick": self.ticks,
+                               "names": [car.name for car in self._cars],
+                               "colors": [list(car.color) for car in self._cars]})
+        with open(os.path.join(self.path, "episodes.json"), "w") as file:
+            json.dump(self._episodes, file)
+
+
+class Trajectory:
+    """ A recorded run, memory-mapped: reading a tick does not touch the ticks before it """
+
+    def __init__(self, path: str) -> None:
+        with open(os.path.join(path, "meta.json")) as file:
+            self.meta = json.load(file)
+        with open(os.path.join(path, "episodes.json")) as file:
+            self.episodes = json.load(file)
+        self.players = self.meta["players"]
+        dtypes = {name: np.dtype(dtype) for name, dtype in self.meta["columns"].items()}
+        # A run that was not closed may end with a partly written chunk
+        self.ticks = min(os.path.getsize(os.path.join(path, f"{name}.bin")) // (dtype.itemsize * self.players)
+                         for name, dtype in dtypes.items())
+        self.columns = {name: np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r",
+                                        shape=(self.ticks, self.players))
+                        if self.ticks > 0 else np.zeros((0, self.players), dtype=dtype)
+                        for name, dtype in dtypes.items()}
+        self._episode_ticks = [episode["tick"] for episode in self.episodes]
+
+    def roads(self) -> list[Road]:
+        return [Road(*definition) for definition in self.meta["roads"]]
+
+    def episode(self, tick: int) -> dict:
+        return self.episodes[bisect.bisect_right(self._episode_ticks, tick) - 1]
+
+    def row(self, tick: int) -> dict[str, np.ndarray]:
+        return {name: column[tick] for name, column in self.columns.items()}
+
+
+class ReplayCar:
+    """ What CarsWindow draws of a car, computed from one recorded row """
+
+    def __init__(self, name, color, seg, direction, loc, speed, size, lane_change, dead) -> None:
+        self.name = name
+        self.color = color
+        self.loc = loc
+        self.speed = speed
+        self.size = size
+        self.dead = dead
+        self.direction = direction
+        self.res = [Reservation(seg, direction, False, loc, loc)]
+        x, y, self.w, self.h = car_geometry(seg, direction, loc, size, lane_change)
+        self.pos = Point(x, y)
+
+
+class ReplayGame:
+    """ Stands in for TrafficEnv in CarsWindow: shows recorded ticks instead of simulating them """
+
+    def __init__(self, trajectory: Trajectory, cache_dir: str = None) -> None:
+        self.trajectory = trajectory
+        self.roads = trajectory.roads()
+        self.network = cached_network(self.roads, cache_dir) if cache_dir is not None \
+            else CompiledNetwork(self.roads, create_segments(self.roads))
+        self.segments = self.network.segments
+        self.players = trajectory.players
+        self.scores = [0] * self.players
+        self.tick = 0
+        self.cars = []
+        self.goals = []
+        if trajectory.ticks > 0:
+            self.seek(0)
+
+    def seek(self, tick: int):
+        """ Shows the given tick, the cost does not depend on how far it is """
+        self.tick = max(0, min(tick, self.trajectory.ticks - 1))
+        row = {name: values.tolist() for name, values in self.trajectory.row(self.tick).items()}
+        episode = self.trajectory.episode(self.tick)
+        colors = [tuple(color) for color in episode["colors"]]
+        self.cars = [ReplayCar(episode["names"][i], colors[i], self.segments[row["segment"][i]],
+                               clock_wise[row["direction"][i]], row["loc"][i], row["speed"][i], row["size"][i],
+                               row["lane_change"][i], row["dead"][i])
+                     for i in range(self.players)]
+        goal_segments: list[LaneSegment] = [self.segments[goal] for goal in row["goal"]]
+        self.goals = [Goal(segment, color) for segment, color in zip(goal_segments, colors)]
+
+    def advance(self) -> bool:
+        """ Moves on to the next tick, False at the end of the recording """
+        if self.tick + 1 >= self.trajectory.ticks:
+            return False
+        self.seek(self.tick + 1)
+        return True
@@ -0,0 +1,66 @@
+""" Maps and fleets of cars for the tests, independent of the benchmark scripts """
+import random
+
+from game_model.car import Car
+from game_model.constants import *
+from game_model.helper_functions import create_segments
+from game_model.maps import grid_roads
+from game_model.road_network import CrossingSegment, LaneSegment, true_direction
+
+
+def spawn_segments(segments) -> list[LaneSegment]:
+    # Lane segments leading into a crossing, the ones at the border of the grid lead nowhere
+    return [seg for seg in segments if isinstance(seg, LaneSegment) and seg.end_crossing is not None]
+
+
+def grid_for(cars: int, **kwargs) -> list:
+    """ The segments of the smallest grid with a spawn segment for every car """
+    n = 2
+    while True:
+        segments = create_segments(grid_roads(n, n, **kwargs))
+        if len(spawn_segments(segments)) >= cars:
+            return segments
+        n += 1
+
+
+def car_at(seg: LaneSegment, loc: int, size: int, name: str, speed: int = 0) -> Car:
+    """ A car driven to loc on seg, cars can only be created at the beginning of a segment """
+    car = Car(name=name, loc=0, segment=seg, speed=speed, size=size, color=WHITE, max_speed=BLOCK_SIZE // 4)
+    car.loc = loc if true_direction[seg.lane.direction] else -loc
+    car.update_reservations()
+    return car
+
+
+def crowded_cars(segments, cars: int, per_segment: int = 3, seed: int = 0) -> list[Car]:
+    """ Several cars at random places of each lane segment, so that some of them collide """
+    rng = random.Random(seed)
+    placed = []
+    for seg in spawn_segments(segments):
+        for _ in range(per_segment):
+            if len(placed) == cars:
+                return placed
+            size = rng.randint(BLOCK_SIZE // 2, BLOCK_SIZE)
+            placed.append(car_at(seg, rng.randint(0, seg.length - size), size, f"car{len(placed)}",
+                                 speed=rng.randint(0, 2)))
+    return placed
+
+
+def random_fleet(segments, cars: int, ticks: int = 3, seed: int = 0) -> list[Car]:
+    """ Cars of random sizes and speeds on random lane segments, driven for a few ticks with random turns,
+    so that some of them are on crossings or span two segments """
+    rng = random.Random(seed)
+    lanes = spawn_segments(segments)
+    placed = []
+    while len(placed) < cars:
+        seg = rng.choice(lanes)
+        size = rng.randint(BLOCK_SIZE // 4, 3 * BLOCK_SIZE // 2)
+        if size < seg.length:
+            placed.append(car_at(seg, rng.randint(0, seg.length - size), size, f"car{len(placed)}",
+                                 speed=rng.randint(0, BLOCK_SIZE // 4)))
+    for _ in range(ticks):
+        for car in placed:
+            last = car.res[-1].seg
+            if isinstance(last, CrossingSegment) and rng.random() < 0.5:
+                car.turn(rng.choice([d for d, next_seg in last.connected_segments.items() if next_seg is not None]))
+            car.move()
+    return placed
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from game_model.collision_kernel import collision_pairs_vectorized
+from game_model.constants import *
+from game_model.helper_functions import collision_check, collision_pairs
+from tests.fleets import car_at, crowded_cars, grid_for, random_fleet, spawn_segments
+
+
+def assert_matches_collision_check(cars, pairs):
+    # collision_check reports one colliding car per car, so a pair needs it from at least one side
+    in_pairs = {i for pair in pairs for i in pair}
+    index = {car: i for i, car in enumerate(cars)}
+    for i, j in pairs:
+        assert collision_check(cars[i]) is not None or collision_check(cars[j]) is not None
+    for i, car in enumerate(cars):
+        other = collision_check(car)
+        if other is not None:
+            assert i in in_pairs
+            assert (min(i, index[other]), max(i, index[other])) in pairs
+        else:
+            # Not flagged itself, so every pair of the car is flagged from the other side
+            assert all(collision_check(cars[j if k == i else k]) is not None
+                       for k, j in pairs if i in (k, j))
+
+
+@pytest.mark.parametrize("cars", [100, 1000])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_crowded_grid(cars, seed):
+    placed = crowded_cars(grid_for((cars + 2) // 3), cars, seed=seed)
+    pairs = collision_pairs(placed)
+    assert pairs
+    assert collision_pairs_vectorized(placed) == pairs
+
+
+@pytest.mark.parametrize("cars", [100, 1000])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_crowded_grid_against_collision_check(cars, seed):
+    placed = crowded_cars(grid_for((cars + 2) // 3), cars, seed=seed)
+    pairs = collision_pairs_vectorized(placed)
+    assert pairs
+    assert_matches_collision_check(placed, pairs)
+
+
+@pytest.mark.parametrize("cars", [100, 1000])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_random_fleet_against_collision_check(cars, seed):
+    placed = random_fleet(grid_for(cars // 2), cars, seed=seed)
+    pairs = collision_pairs_vectorized(placed)
+    assert pairs
+    assert pairs == collision_pairs(placed)
+    assert_matches_collision_check(placed, pairs)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_after_lane_changes(seed):
+    # Three lanes per direction, so that cars move into lanes crowded by others
+    placed = crowded_cars(grid_for(100, right=3, left=3), 300, seed=seed)
+    rng = random.Random(seed)
+    changed = [car for car in placed if rng.random() < 0.5 and car.change_lane(rng.choice((-1, 1))) is True]
+    assert changed
+    pairs = collision_pairs_vectorized(placed)
+    assert pairs == collision_pairs(placed)
+    assert_matches_collision_check(placed, pairs)
+
+
+@pytest.mark.parametrize("gap", [-1, 0, 1])
+def test_touching_cars(gap):
+    # The rear car ends gap before the front car begins, -1 is an overlap of one unit
+    placed = []
+    for seg in spawn_segments(grid_for(4))[:4]:
+        size = BLOCK_SIZE // 2
+        placed.append(car_at(seg, 0, size, f"car{len(placed)}"))
+        placed.append(car_at(seg, size + gap, size, f"car{len(placed)}"))
+    pairs = collision_pairs(placed)
+    # Cars that only touch do not crash
+    assert len(pairs) == (4 if gap < 0 else 0)
+    assert collision_pairs_vectorized(placed) == pairs
+    assert_matches_collision_check(placed, pairs)
@@ -1,5 +1,4 @@
 from game_model.constants import *
-from game_model.road_network import LaneSegment
 from timed_automata.timed_automata_classes import TimedAutomata, State, Transition
 
 from game_model.game_model import TrafficEnv
@@ -7,20 +6,8 @@ from game_model.game_model import TrafficEnv
 
 def collision_check(game: TrafficEnv, player: int):
     car = game.cars[player]
-    segment = car.res[0]
-    seg_info = car.get_segment_info(segment)
-    begin = abs(seg_info["begin"])
-    end = abs(seg_info["end"])
-    for other_car in segment.cars:
-        if other_car != car:
-            other_car_seg_info = other_car.get_segment_info(segment)
-            o_begin = abs(other_car_seg_info["begin"])
-            o_end = abs(other_car_seg_info["end"])
-            if begin <= o_begin <= end:
-                return False
-            elif begin <= o_end <= end:
-                return False
-    return True
+    seg_info = car.res[0]
+    return not seg_info.seg.intervals.overlapping(abs(seg_info.begin), abs(seg_info.end), exclude=car)
 
 
 def potential_collision_check(game: TrafficEnv, player: int, lane_diff: int):
@@ -28,25 +15,7 @@ def potential_collision_check(game: TrafficEnv, player: int, lane_diff: int):
     segment = car.get_adjacent_lane_segment(lane_diff)
     if segment is None:
         return False
-    seg_info = {
-        "seg": segment,
-        "dir": car.direction,
-        "turn": False,
-        "begin": car.res[0]["begin"],
-        "end": car.res[0]["end"]
-    }
-    begin = abs(seg_info["begin"])
-    end = abs(seg_info["end"])
-    for other_car in segment.cars:
-        if other_car != car:
-            other_car_seg_info = other_car.get_segment_info(segment)
-            o_begin = abs(other_car_seg_info["begin"])
-            o_end = abs(other_car_seg_info["end"])
-            if begin <= o_begin <= end:
-                return False
-            elif begin <= o_end <= end:
-                return False
-    return True
+    return not segment.intervals.overlapping(abs(car.res[0].begin), abs(car.res[0].end), exclude=car)
 
 
 def pc1(game: TrafficEnv, player: int):